@@ -4,16 +4,18 @@
     "summary": "Data seen",
     "author": "Ahad Rasool",
     "version": "1.0",
-    "depends": [ "account",'web'],
+    "depends": [ "account",'web','portal'],
     "data": [
         'security/ir.model.access.csv',
+        'data/ir_cron.xml',
         'views/ledger.xml',
-        'views/portal_ledger_template.xml'
-
+        'views/portal_ledger_template.xml',
+        'views/portal_ledger_page.xml',
     ],
-    'external_dependencies': {
-        'python': [
-            'seaborn',
+    "assets": {
+        'partner_portal_ledger.assets_ledger': [
+            'partner_portal_ledger/static/src/css/portal_ledger.css',
+            'partner_portal_ledger/static/src/js/portal_ledger.js',
         ],
     },
     "installable": True,
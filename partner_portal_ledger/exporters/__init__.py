@@ -0,0 +1,74 @@
+""" Registry of the ledger export formats.
+
+Backends are registered by module path and only imported the first time a
+format is requested, so workers never load openpyxl, reportlab or pyarrow unless
+a partner actually exports to XLSX, PDF or Parquet/Arrow.
+"""
+import importlib
+import io
+import logging
+
+from .base import group_label
+
+_logger = logging.getLogger(__name__)
+
+# format -> (module path relative to this package, exporter class name)
+EXPORTERS = {
+    'csv': ('.csv_exporter', 'CsvLedgerExporter'),
+    'xlsx': ('.xlsx_exporter', 'XlsxLedgerExporter'),
+    'pdf': ('.pdf_exporter', 'PdfLedgerExporter'),
+    'parquet': ('.arrow_exporter', 'ParquetLedgerExporter'),
+    'arrow': ('.arrow_exporter', 'ArrowLedgerExporter'),
+}
+
+_loaded = {}
+# format -> ImportError of a backend whose library is missing
+_failed = {}
+
+
+def register(fmt, module_path, class_name):
+    """ Register (or override) the exporter of ``fmt``, e.g. from another addon """
+    EXPORTERS[fmt] = (module_path, class_name)
+    _loaded.pop(fmt, None)
+    _failed.pop(fmt, None)
+
+
+def get_exporter(fmt):
+    """ Return the exporter class of ``fmt``, importing its module on first use.
+
+    :raise KeyError: if no exporter is registered for ``fmt``
+    :raise ImportError: if the library behind the exporter is not installed;
+        the failure is remembered, the import is not tried again until the
+        format is registered again or the worker restarts
+    """
+    if fmt in _failed:
+        raise _failed[fmt]
+    if fmt not in _loaded:
+        module_path, class_name = EXPORTERS[fmt]
+        try:
+            module = importlib.import_module(module_path, __name__)
+        except ImportError as e:
+            _logger.warning("Ledger export format %s is unavailable: %s", fmt, e)
+            _failed[fmt] = e
+            raise
+        _loaded[fmt] = getattr(module, class_name)
+    return _loaded[fmt]
+
+
+def is_available(fmt):
+    try:
+        get_exporter(fmt)
+    except (KeyError, ImportError):
+        return False
+    return True
+
+
+def render(fmt, **kwargs):
+    """ Render a ledger to bytes with the exporter of ``fmt``, built from ``kwargs``.
+
+    A plain function of picklable values, so it can run in the worker
+    processes of a multiprocessing pool.
+    """
+    output = io.BytesIO()
+    get_exporter(fmt)(**kwargs).write(output)
+    return output.getvalue()
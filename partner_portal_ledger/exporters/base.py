@@ -0,0 +1,58 @@
+def group_label(group_date, group_by, date_format):
+    """ Label of the day/month/year group starting on ``group_date`` """
+    if group_by == 'day':
+        return group_date.strftime(date_format)
+    if group_by == 'month':
+        return group_date.strftime('%Y-%m')
+    return group_date.strftime('%Y')
+
+
+class LedgerExporter:
+    """ Render ledger rows into a file.
+
+    Exporters only work on the plain values they are given (LedgerRow and
+    LedgerGroup tuples, amounts, strings), never on the ORM or the request,
+    so the same rendering serves the portal routes and backend jobs.
+
+    :param rows: iterable of ``LedgerRow``, in the order given by ``descending``
+    :param groups: dict of ``LedgerGroup`` by group date, empty when ungrouped
+    :param opening_balance: balance before ``filters.date_from``
+    :param filters: the ``LedgerFilters`` the rows were selected with
+    :param date_format: strftime pattern of the user's language
+    :param title: document title, e.g. "Customer Ledger - Azure Interior"
+    """
+    fmt = None
+    content_type = 'application/octet-stream'
+    # True when rows are expected newest first
+    descending = True
+    # True when chunks() can produce the file without a seekable output
+    streaming = False
+    # True when combine() can join the files of several ledgers into one
+    combinable = False
+
+    def __init__(self, rows, groups, opening_balance, filters, date_format, title):
+        self.rows = rows
+        self.groups = groups
+        self.opening_balance = opening_balance
+        self.filters = filters
+        self.date_format = date_format
+        self.title = title
+
+    def group_label(self, group_date):
+        return group_label(group_date, self.filters.group_by, self.date_format)
+
+    def chunks(self):
+        """ Yield the file as bytes chunks; only for ``streaming`` exporters """
+        raise NotImplementedError()
+
+    @classmethod
+    def combine(cls, files, fileobj):
+        """ Write the files of several ledgers, given as ``(title, bytes)``
+        pairs, to ``fileobj`` as a single file; only for ``combinable`` exporters
+        """
+        raise NotImplementedError()
+
+    def write(self, fileobj):
+        """ Write the whole file to the binary file object ``fileobj`` """
+        for chunk in self.chunks():
+            fileobj.write(chunk)
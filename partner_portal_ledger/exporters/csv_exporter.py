@@ -0,0 +1,61 @@
+import csv
+from io import StringIO
+
+from .base import LedgerExporter
+
+CHUNK_SIZE = 64 * 1024
+
+
+class CsvLedgerExporter(LedgerExporter):
+    fmt = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+    streaming = True
+    combinable = True
+
+    @classmethod
+    def combine(cls, files, fileobj):
+        """ Concatenate the ledgers, each one under a row holding its title """
+        for index, (title, data) in enumerate(files):
+            output = StringIO()
+            writer = csv.writer(output)
+            if index:
+                writer.writerow([])
+            writer.writerow([title])
+            fileobj.write(output.getvalue().encode('utf-8'))
+            fileobj.write(data)
+
+    def chunks(self):
+        """ Yield the CSV as encoded chunks while the rows are walked batch by batch """
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['Date', 'Move', 'Description', 'Debit', 'Credit', 'Balance'])
+
+        current_group = None
+        for row in self.rows:
+            if row.group_date is not None and row.group_date != current_group:
+                group = self.groups[row.group_date]
+                writer.writerow([
+                    f'Group: {self.group_label(group.group_date)}',
+                    '',
+                    f'{group.count} entries',
+                    f'{group.debit:.2f}',
+                    f'{group.credit:.2f}',
+                    f'{group.net:.2f}'
+                ])
+                current_group = row.group_date
+            writer.writerow([
+                row.date.strftime(self.date_format),
+                row.move_name or '',
+                row.name or '',
+                f'{row.debit:.2f}',
+                f'{row.credit:.2f}',
+                f'{row.running_balance:.2f}'
+            ])
+            if output.tell() >= CHUNK_SIZE:
+                yield output.getvalue().encode('utf-8')
+                output.seek(0)
+                output.truncate()
+        # Rows are newest first, so the opening balance closes the file
+        if self.filters.date_from:
+            writer.writerow(['Opening Balance', '', '', '', '', f'{self.opening_balance:.2f}'])
+        yield output.getvalue().encode('utf-8')
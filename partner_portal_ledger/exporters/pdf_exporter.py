@@ -0,0 +1,163 @@
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph, Table, TableStyle
+
+from odoo.tools.pdf import merge_pdf
+
+from .base import LedgerExporter
+
+PAGE_SIZE = landscape(letter)
+TOP_MARGIN = BOTTOM_MARGIN = 0.5 * inch
+COL_WIDTHS = [1.2 * inch, 1.2 * inch, 2.5 * inch, 0.8 * inch, 0.8 * inch, 1 * inch]
+DESCRIPTION_COL = 2
+
+FONT_SIZE = 10
+HEADER_FONT_SIZE = 12
+TITLE_FONT_SIZE = 14
+CELL_PADDING = 4
+# Fixed heights of the rows that never wrap, padding included
+ROW_HEIGHT = FONT_SIZE * 1.2 + 6
+HEADER_HEIGHT = HEADER_FONT_SIZE * 1.2 + 15
+TITLE_HEIGHT = 16 + 12
+
+HEADER = ['Date', 'Move', 'Description', 'Debit', 'Credit', 'Balance']
+HEADER_COLOR = colors.HexColor('#5a9bd5')
+GROUP_COLOR = colors.HexColor('#edf2f7')
+
+BASE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), HEADER_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), HEADER_FONT_SIZE),
+    ('FONTSIZE', (0, 1), (-1, -1), FONT_SIZE),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('LEFTPADDING', (0, 0), (-1, -1), CELL_PADDING),
+    ('RIGHTPADDING', (0, 0), (-1, -1), CELL_PADDING),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+]
+
+DESCRIPTION_STYLE = ParagraphStyle('LedgerDescription', fontName='Helvetica', fontSize=FONT_SIZE, leading=12)
+
+
+class PdfLedgerExporter(LedgerExporter):
+    """ Ledger PDF laid out one page at a time.
+
+    Rows are packed into page-sized tables, each with the column header, a
+    "Balance brought forward" row on top and a "Balance carried forward"
+    row at the bottom, drawn directly on the canvas. Only the rows of the
+    current page are held as flowables, and the table layout and style
+    commands never span more than one page. Descriptions only become
+    Paragraphs when they are too wide for their column.
+    """
+    fmt = 'pdf'
+    content_type = 'application/pdf'
+    descending = False
+    combinable = True
+
+    @classmethod
+    def combine(cls, files, fileobj):
+        fileobj.write(merge_pdf([data for _title, data in files]))
+
+    def write(self, fileobj):
+        canvas = Canvas(fileobj, pagesize=PAGE_SIZE, pageCompression=1)
+        canvas.setTitle(self.title)
+        page_width, page_height = PAGE_SIZE
+        table_left = (page_width - sum(COL_WIDTHS)) / 2
+        page_number = 1
+
+        top = page_height - TOP_MARGIN - TITLE_HEIGHT
+        balance = self.opening_balance
+        brought_forward = None
+        lines = []
+        # room left for lines, the bottom "carried forward" row being reserved
+        room = top - BOTTOM_MARGIN - HEADER_HEIGHT - ROW_HEIGHT
+        for line in self._lines():
+            cells, height, kind, line_balance = line
+            if lines and height > room:
+                self._draw_page(canvas, table_left, top, page_number, lines, brought_forward, balance)
+                canvas.showPage()
+                page_number += 1
+                top = page_height - TOP_MARGIN
+                brought_forward, lines = balance, []
+                room = top - BOTTOM_MARGIN - HEADER_HEIGHT - 2 * ROW_HEIGHT
+            lines.append(line)
+            room -= height
+            if line_balance is not None:
+                balance = line_balance
+        self._draw_page(canvas, table_left, top, page_number, lines, brought_forward, None)
+        canvas.save()
+
+    def _lines(self):
+        """ Yield ``(cells, height, kind, balance)`` for every body row of the
+        ledger, ``balance`` being the running balance after that row, if any.
+        """
+        if self.filters.date_from:
+            yield (['Opening Balance', '', '', '', '', f'{self.opening_balance:.2f}'],
+                   ROW_HEIGHT, 'balance', self.opening_balance)
+        description_width = COL_WIDTHS[DESCRIPTION_COL] - 2 * CELL_PADDING
+        current_group = None
+        for row in self.rows:
+            if row.group_date is not None and row.group_date != current_group:
+                group = self.groups[row.group_date]
+                yield ([
+                    f'Group: {self.group_label(group.group_date)}',
+                    '',
+                    f'{group.count} entries',
+                    f'{group.debit:.2f}',
+                    f'{group.credit:.2f}',
+                    f'{group.net:.2f}'
+                ], ROW_HEIGHT, 'group', None)
+                current_group = row.group_date
+            description = row.name or ''
+            height = ROW_HEIGHT
+            if stringWidth(description, 'Helvetica', FONT_SIZE) > description_width:
+                description = Paragraph(escape(description), DESCRIPTION_STYLE)
+                height = max(ROW_HEIGHT, description.wrap(description_width, PAGE_SIZE[1])[1] + 6)
+            yield ([
+                row.date.strftime(self.date_format),
+                row.move_name or '',
+                description,
+                f'{row.debit:.2f}',
+                f'{row.credit:.2f}',
+                f'{row.running_balance:.2f}'
+            ], height, 'row', row.running_balance)
+
+    def _draw_page(self, canvas, left, top, page_number, lines, brought_forward, carried_forward):
+        """ Draw one page of ``lines`` under the header, between the optional
+        brought forward and carried forward balance rows.
+        """
+        data, heights, style = [HEADER], [HEADER_HEIGHT], list(BASE_STYLE)
+        if page_number == 1:
+            canvas.setFont('Helvetica-Bold', TITLE_FONT_SIZE)
+            canvas.drawCentredString(PAGE_SIZE[0] / 2, top + 12, self.title)
+        if brought_forward is not None:
+            lines = [(['Balance brought forward', '', '', '', '', f'{brought_forward:.2f}'],
+                      ROW_HEIGHT, 'balance', None)] + lines
+        if carried_forward is not None:
+            lines = lines + [(['Balance carried forward', '', '', '', '', f'{carried_forward:.2f}'],
+                              ROW_HEIGHT, 'balance', None)]
+        for index, (cells, height, kind, _balance) in enumerate(lines, start=1):
+            data.append(cells)
+            heights.append(height)
+            if kind == 'group':
+                style.append(('BACKGROUND', (0, index), (-1, index), GROUP_COLOR))
+                style.append(('FONTNAME', (0, index), (-1, index), 'Helvetica-Bold'))
+            elif kind == 'balance':
+                style.append(('SPAN', (0, index), (-2, index)))
+                style.append(('FONTNAME', (0, index), (-1, index), 'Helvetica-Oblique'))
+
+        table = Table(data, colWidths=COL_WIDTHS, rowHeights=heights)
+        table.setStyle(TableStyle(style))
+        _width, table_height = table.wrapOn(canvas, sum(COL_WIDTHS), top - BOTTOM_MARGIN)
+        table.drawOn(canvas, left, top - table_height)
+
+        canvas.setFont('Helvetica', 8)
+        canvas.drawCentredString(PAGE_SIZE[0] / 2, BOTTOM_MARGIN / 2, f'Page {page_number}')
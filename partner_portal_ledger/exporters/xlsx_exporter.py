@@ -0,0 +1,96 @@
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle
+
+from .base import LedgerExporter
+
+XLSX_MAX_ROWS = 1048576
+STRFTIME_TO_EXCEL = {
+    '%Y': 'yyyy', '%y': 'yy', '%m': 'mm', '%d': 'dd',
+    '%B': 'mmmm', '%b': 'mmm', '%A': 'dddd', '%a': 'ddd',
+}
+
+
+class XlsxLedgerExporter(LedgerExporter):
+    fmt = 'xlsx'
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    def write(self, fileobj):
+        """ Write the ledger with a write-only workbook.
+
+        Rows are serialised as they are appended instead of being kept as a
+        cell graph, dates and amounts are real typed cells sharing one named
+        style per column, and a new sheet is started whenever one is full.
+        """
+        wb = Workbook(write_only=True)
+        column_styles = [
+            NamedStyle(name='ledger_date', number_format=self._excel_date_format(self.date_format)),
+            None,
+            None,
+            NamedStyle(name='ledger_debit', number_format='#,##0.00'),
+            NamedStyle(name='ledger_credit', number_format='#,##0.00'),
+            NamedStyle(name='ledger_balance', number_format='#,##0.00'),
+        ]
+        for style in column_styles:
+            if style:
+                wb.add_named_style(style)
+
+        sheets = []
+
+        def new_sheet():
+            title = "Customer Ledger" if not sheets else f"Customer Ledger ({len(sheets) + 1})"
+            ws = wb.create_sheet(title)
+            for letter, width in zip('ABCDEF', (12, 18, 50, 14, 14, 14)):
+                ws.column_dimensions[letter].width = width
+            ws.append(['Date', 'Move', 'Description', 'Debit', 'Credit', 'Balance'])
+            sheets.append(ws)
+            return ws
+
+        def styled(ws, values):
+            cells = []
+            for value, style in zip(values, column_styles):
+                if style:
+                    cell = WriteOnlyCell(ws, value=value)
+                    cell.style = style.name
+                    cells.append(cell)
+                else:
+                    cells.append(value)
+            return cells
+
+        ws = new_sheet()
+        ws_rows = 1
+        current_group = None
+        for row in self.rows:
+            if row.group_date is not None and row.group_date != current_group:
+                if ws_rows >= XLSX_MAX_ROWS:
+                    ws, ws_rows = new_sheet(), 1
+                group = self.groups[row.group_date]
+                ws.append(styled(ws, [
+                    f'Group: {self.group_label(group.group_date)}',
+                    None,
+                    f'{group.count} entries',
+                    group.debit,
+                    group.credit,
+                    group.net,
+                ]))
+                ws_rows += 1
+                current_group = row.group_date
+            if ws_rows >= XLSX_MAX_ROWS:
+                ws, ws_rows = new_sheet(), 1
+            ws.append(styled(ws, [row.date, row.move_name or '', row.name or '', row.debit, row.credit, row.running_balance]))
+            ws_rows += 1
+
+        # Rows are newest first, so the opening balance closes the sheet
+        if self.filters.date_from:
+            if ws_rows >= XLSX_MAX_ROWS:
+                ws = new_sheet()
+            ws.append(styled(ws, ['Opening Balance', None, None, None, None, self.opening_balance]))
+
+        wb.save(fileobj)
+
+    def _excel_date_format(self, date_format):
+        """ Translate an strftime pattern such as ``%d/%m/%Y`` to ``dd/mm/yyyy`` """
+        excel_format = date_format
+        for directive, token in STRFTIME_TO_EXCEL.items():
+            excel_format = excel_format.replace(directive, token)
+        return excel_format
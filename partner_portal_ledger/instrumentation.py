@@ -0,0 +1,300 @@
+""" Per-request timings of the ledger routes.
+
+Every ledger route runs under a :class:`RouteTimer` recording the SQL
+queries and their time (from the counters Odoo keeps on the request
+thread), the ledger cache hits and misses (counted the same way), the time
+spent fetching ledger data and rendering it, the ledger rows read and the
+response bytes. Phases nest: time spent fetching rows
+while an exporter renders them counts as fetch time only.
+
+When the request ends, the metrics are logged at debug level as one JSON
+object, optionally sent back in a ``Server-Timing`` header, and added to
+per-route duration histograms. The histograms are accumulated in memory by
+each worker and merged into ``tt.partner.ledger.route.timing`` every
+``FLUSH_INTERVAL`` seconds, when the worker's cache counters are logged at
+debug level as well.
+"""
+import bisect
+import collections
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+
+from odoo.http import request
+from odoo.modules.registry import Registry
+
+from .ledger_cache import LEDGER_CACHE
+
+_logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in milliseconds; slower requests
+# fall in an extra, unbounded bucket
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+FLUSH_INTERVAL = 60
+# Set to add the Server-Timing header to the ledger responses
+SERVER_TIMING_PARAM = 'partner_portal_ledger.server_timing'
+
+# Totals kept per (route, bucket), see tt.partner.ledger.route.timing
+HISTOGRAM_FIELDS = ('count', 'duration', 'sql_time', 'fetch_time', 'render_time', 'query_count',
+                    'cache_hits', 'cache_misses', 'rows', 'bytes')
+
+_local = threading.local()
+
+
+def bucket_of(duration_ms):
+    """ Index of the histogram bucket of ``duration_ms`` """
+    return bisect.bisect_left(BUCKETS_MS, duration_ms)
+
+
+def bucket_label(bucket):
+    if bucket < len(BUCKETS_MS):
+        return f'≤ {BUCKETS_MS[bucket]} ms'
+    return f'> {BUCKETS_MS[-1]} ms'
+
+
+class RouteTimer:
+    """ Metrics of one request to a ledger route """
+
+    def __init__(self, route, dbname):
+        self.route = route
+        self.dbname = dbname
+        self.phases = collections.defaultdict(float)
+        self.rows = 0
+        self.bytes = 0
+        self._stack = []
+        thread = threading.current_thread()
+        self._queries_start = getattr(thread, 'query_count', 0)
+        self._sql_time_start = getattr(thread, 'query_time', 0.0)
+        self._cache_hits_start = getattr(thread, 'ledger_cache_hits', 0)
+        self._cache_misses_start = getattr(thread, 'ledger_cache_misses', 0)
+        self._start = time.perf_counter()
+        self._end = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """ Count the time spent in the block as ``name``, less the nested phases """
+        now = time.perf_counter()
+        if self._stack:
+            outer, since = self._stack[-1]
+            self.phases[outer] += now - since
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _name, since = self._stack.pop()
+            self.phases[name] += now - since
+            if self._stack:
+                self._stack[-1][1] = now
+
+    def metrics(self):
+        thread = threading.current_thread()
+        end = self._end or time.perf_counter()
+        return {
+            'route': self.route,
+            'duration': round((end - self._start) * 1000, 2),
+            'query_count': getattr(thread, 'query_count', 0) - self._queries_start,
+            'sql_time': round((getattr(thread, 'query_time', 0.0) - self._sql_time_start) * 1000, 2),
+            'fetch_time': round(self.phases['fetch'] * 1000, 2),
+            'render_time': round(self.phases['render'] * 1000, 2),
+            'cache_hits': getattr(thread, 'ledger_cache_hits', 0) - self._cache_hits_start,
+            'cache_misses': getattr(thread, 'ledger_cache_misses', 0) - self._cache_misses_start,
+            'rows': self.rows,
+            'bytes': self.bytes,
+        }
+
+    def server_timing(self):
+        """ ``Server-Timing`` header value of the metrics so far """
+        metrics = self.metrics()
+        return ', '.join([
+            f'sql;dur={metrics["sql_time"]};desc="{metrics["query_count"]} queries"',
+            f'fetch;dur={metrics["fetch_time"]};desc="{metrics["rows"]} rows"',
+            f'render;dur={metrics["render_time"]}',
+            f'cache;desc="{metrics["cache_hits"]} hits, {metrics["cache_misses"]} misses"',
+            f'total;dur={metrics["duration"]}',
+        ])
+
+    def finish(self):
+        self._end = time.perf_counter()
+        metrics = self.metrics()
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("ledger route timing %s", json.dumps(metrics, sort_keys=True))
+        HISTOGRAMS.record(self.dbname, metrics)
+
+    @contextlib.contextmanager
+    def active(self):
+        """ Make this timer the one of the current thread """
+        previous = getattr(_local, 'timer', None)
+        _local.timer = self
+        try:
+            yield self
+        finally:
+            _local.timer = previous
+
+
+def current_timer():
+    return getattr(_local, 'timer', None)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """ Time the block as ``name`` in the current request, if it is timed """
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+def count_rows(count):
+    timer = current_timer()
+    if timer is not None:
+        timer.rows += count
+
+
+def timed(name, rows=False):
+    """ Time a method as phase ``name``, counting the length of its result
+    as ledger rows if ``rows`` is set.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if current_timer() is None:
+                return method(*args, **kwargs)
+            with phase(name):
+                result = method(*args, **kwargs)
+            if rows:
+                count_rows(len(result))
+            return result
+        return wrapper
+    return decorator
+
+
+class RouteHistograms:
+    """ Per-route duration histograms accumulated between two flushes """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = collections.defaultdict(lambda: [0] * len(HISTOGRAM_FIELDS))
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def record(self, dbname, metrics):
+        key = (dbname, metrics['route'], bucket_of(metrics['duration']))
+        with self._lock:
+            totals = self._pending[key]
+            totals[0] += 1
+            for index, field in enumerate(HISTOGRAM_FIELDS[1:], start=1):
+                totals[index] += metrics[field]
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def take(self, dbname=None):
+        """ Remove and return the pending totals of ``dbname`` (all if None) """
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            keys = [key for key in self._pending if dbname is None or key[0] == dbname]
+            return {key: self._pending.pop(key) for key in keys}
+
+    def flush(self, dbname=None):
+        """ Merge the pending totals into the databases' timing tables """
+        by_db = collections.defaultdict(dict)
+        for (db, route, bucket), totals in self.take(dbname).items():
+            by_db[db][(route, bucket)] = totals
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("ledger cache %s", json.dumps(LEDGER_CACHE.stats(), sort_keys=True))
+        for db, histograms in by_db.items():
+            try:
+                with Registry(db).cursor() as cr:
+                    _merge_histograms(cr, histograms)
+            except Exception:
+                _logger.warning("Could not save the ledger route timings of %s", db, exc_info=True)
+
+
+def _merge_histograms(cr, histograms):
+    columns = ', '.join(HISTOGRAM_FIELDS)
+    updates = ', '.join(f'{field} = t.{field} + EXCLUDED.{field}' for field in HISTOGRAM_FIELDS)
+    for (route, bucket), totals in histograms.items():
+        cr.execute(f"""
+            INSERT INTO tt_partner_ledger_route_timing AS t (route, bucket, bucket_label, {columns})
+                 VALUES (%s, %s, %s, {', '.join(['%s'] * len(HISTOGRAM_FIELDS))})
+            ON CONFLICT (route, bucket) DO UPDATE SET {updates}
+        """, [route, bucket, bucket_label(bucket), *totals])
+
+
+HISTOGRAMS = RouteHistograms()
+
+
+def instrumented(route, allowed=None):
+    """ Time the decorated controller method as ``route``, formatted with the
+    method's keyword arguments, e.g. ``'/my/ledger/export/{fmt}'``.
+
+    Each route name gets its own rows in the timing table, so the arguments
+    formatted into it must be restricted with ``allowed``, a dict of the
+    allowed values by argument name; other values are formatted as
+    ``unknown``, e.g. formats made up by the client.
+
+    Responses with a streamed body are timed until the body is exhausted;
+    their ``Server-Timing`` header can only cover the work done before the
+    first byte is sent.
+    """
+    allowed = allowed or {}
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            names = {
+                key: value if key not in allowed or value in allowed[key] else 'unknown'
+                for key, value in kwargs.items()
+            }
+            timer = RouteTimer(route.format(**names), request.db)
+            with timer.active():
+                response = method(self, *args, **kwargs)
+                if getattr(response, 'is_qweb', False):
+                    with timer.phase('render'):
+                        response.flatten()
+            return _finish(timer, response)
+        return wrapper
+    return decorator
+
+
+def _finish(timer, response):
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        # JSON routes return their result, serialized later by the
+        # dispatcher: their response bytes are not counted
+        timer.finish()
+        return response
+    server_timing = request.env['ir.config_parameter'].sudo().get_param(SERVER_TIMING_PARAM)
+    if response.is_streamed and response.content_length is None:
+        if server_timing:
+            headers['Server-Timing'] = timer.server_timing()
+        response.response = _timed_body(timer, response.response)
+        return response
+    timer.bytes = response.content_length if response.content_length is not None else len(response.get_data())
+    if server_timing:
+        headers['Server-Timing'] = timer.server_timing()
+    timer.finish()
+    return response
+
+
+def _timed_body(timer, body):
+    try:
+        iterator = iter(body)
+        while True:
+            with timer.active():
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+            timer.bytes += len(chunk)
+            yield chunk
+    finally:
+        close = getattr(body, 'close', None)
+        if close is not None:
+            close()
+        timer.finish()
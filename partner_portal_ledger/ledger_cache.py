@@ -0,0 +1,118 @@
+""" Process-wide cache of ledger query results.
+
+Entries are keyed by database, partner, the partner's ledger generation and
+the normalised filters. The generation is derived from the partner's rows in
+the ``partner_ledger_change`` log, where every transaction creating, writing
+or unlinking journal items or entries of the partner inserts a marker as
+part of itself. Each worker keeps its own cache while a change committed by
+any of them makes the stale entries unreachable everywhere, in the same
+snapshot as the change itself; they are then evicted as least recently used.
+"""
+import collections
+import functools
+import sys
+import threading
+
+# Bound of the cache, in bytes of the cached values, per worker
+CACHE_MAX_SIZE = 32 * 1024 * 1024
+# Larger results are not cached, they would evict everything else
+CACHE_MAX_ENTRY_SIZE = CACHE_MAX_SIZE // 16
+
+
+def _sizeof(value):
+    """ Approximate memory held by ``value``, following lists, tuples and dicts """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_sizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_sizeof(key) + _sizeof(item) for key, item in value.items())
+    return size
+
+
+class LedgerCache:
+    """ Thread-safe LRU mapping, bounded by the total size of its values in bytes """
+
+    def __init__(self, max_size=CACHE_MAX_SIZE, max_entry_size=CACHE_MAX_ENTRY_SIZE):
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """ Return ``(True, value)`` on a hit, ``(False, None)`` on a miss.
+
+        Hits and misses are also counted on the current thread, like Odoo
+        counts queries, so a request can tell its own from the other ones.
+        """
+        thread = threading.current_thread()
+        with self._lock:
+            try:
+                value, _size = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                thread.ledger_cache_misses = getattr(thread, 'ledger_cache_misses', 0) + 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            thread.ledger_cache_hits = getattr(thread, 'ledger_cache_hits', 0) + 1
+            return True, value
+
+    def set(self, key, value):
+        size = _sizeof(value)
+        if size > self.max_entry_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _key, (_value, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size': self.size,
+                'max_size': self.max_size,
+            }
+
+
+LEDGER_CACHE = LedgerCache()
+
+
+def ledger_cached(method):
+    """ Cache the result of a ``tt.partner.ledger`` method taking ``(partner, filters, ...)``.
+
+    The remaining arguments must be hashable; cached values are shared
+    between requests and must not be mutated by the callers.
+    """
+    @functools.wraps(method)
+    def wrapper(self, partner, filters, *args, **kwargs):
+        generation = self._ledger_generation(partner)
+        if generation is None:
+            return method(self, partner, filters, *args, **kwargs)
+        key = (
+            self.env.cr.dbname, partner.id, generation, method.__name__,
+            filters, args, tuple(sorted(kwargs.items())),
+        )
+        hit, value = LEDGER_CACHE.get(key)
+        if not hit:
+            value = method(self, partner, filters, *args, **kwargs)
+            LEDGER_CACHE.set(key, value)
+        return value
+    return wrapper
@@ -1 +1,13 @@
-from . import partner_ledger_gi
\ No newline at end of file
+from . import partner_ledger_gi
+from . import partner_ledger
+from . import account_move_line
+from . import account_move
+from . import account_account
+from . import ir_attachment
+from . import partner_ledger_background
+from . import partner_ledger_export_job
+from . import partner_ledger_snapshot
+from . import partner_ledger_route_timing
+from . import partner_ledger_batch
+from . import partner_ledger_statement
+from . import partner_ledger_sync_token
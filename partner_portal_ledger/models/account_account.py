@@ -0,0 +1,16 @@
+from odoo import models
+
+from .partner_ledger import LEDGER_ACCOUNT_TYPES
+
+
+class AccountAccount(models.Model):
+    _inherit = 'account.account'
+
+    def write(self, vals):
+        if 'account_type' in vals:
+            # lines of these accounts enter or leave the partner ledgers
+            moved = self.filtered(lambda account: (account.account_type in LEDGER_ACCOUNT_TYPES)
+                                  != (vals['account_type'] in LEDGER_ACCOUNT_TYPES))
+            if moved:
+                self.env['tt.partner.ledger']._ledger_accounts_changed(moved)
+        return super().write(vals)
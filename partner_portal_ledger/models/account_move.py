@@ -0,0 +1,30 @@
+from odoo import models
+
+# Written fields of the entry changing what the partner ledger shows of its lines
+LEDGER_MOVE_FIELDS = {'name', 'date', 'partner_id', 'line_ids', 'invoice_line_ids'}
+# Those of them that may recompute the partner or account of its lines
+LEDGER_MOVE_PARTNER_FIELDS = {'partner_id', 'line_ids', 'invoice_line_ids'}
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    def write(self, vals):
+        if not LEDGER_MOVE_FIELDS.intersection(vals):
+            return super().write(vals)
+        Ledger = self.env['tt.partner.ledger']
+        lines = self.line_ids
+        Ledger._ledger_lines_changed(lines)
+        moved = LEDGER_MOVE_PARTNER_FIELDS.intersection(vals)
+        ledger_partners = lines._partner_ledger_partners() if moved else {}
+        res = super().write(vals)
+        Ledger._ledger_lines_changed(self.line_ids)
+        if moved:
+            # the lines' partner and account are recomputed through _write,
+            # without going through AccountMoveLine.write
+            lines._record_ledger_departures(ledger_partners)
+        return res
+
+    def unlink(self):
+        self.env['tt.partner.ledger']._ledger_lines_changed(self.line_ids)
+        return super().unlink()
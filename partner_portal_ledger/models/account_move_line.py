@@ -0,0 +1,137 @@
+import logging
+
+import psycopg2
+
+from odoo import api, fields, models
+from odoo.tools.sql import column_exists, create_column
+
+from .partner_ledger import LEDGER_ACCOUNT_TYPES
+
+_logger = logging.getLogger(__name__)
+
+# (index name, table, column) of the trigram indexes backing the search_term filter
+LEDGER_TRIGRAM_INDEXES = [
+    ('partner_ledger_aml_name_trgm_idx', 'account_move_line', 'name'),
+    ('partner_ledger_am_name_trgm_idx', 'account_move', 'name'),
+]
+
+# Written fields changing what the partner ledger shows
+LEDGER_LINE_FIELDS = {'partner_id', 'account_id', 'move_id', 'date', 'name', 'debit', 'credit', 'balance'}
+
+
+class AccountMoveLine(models.Model):
+    _inherit = 'account.move.line'
+
+    # Copy of the account type on the line itself, so the ledger filter and
+    # the partial index below need no join to account_account
+    partner_ledger_account_type = fields.Selection(related='account_id.account_type', store=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['tt.partner.ledger']._ledger_lines_changed(lines)
+        return lines
+
+    def write(self, vals):
+        if not LEDGER_LINE_FIELDS.intersection(vals):
+            return super().write(vals)
+        Ledger = self.env['tt.partner.ledger']
+        Ledger._ledger_lines_changed(self)
+        moved = 'partner_id' in vals or 'account_id' in vals
+        ledger_partners = self._partner_ledger_partners() if moved else {}
+        res = super().write(vals)
+        Ledger._ledger_lines_changed(self)
+        if moved:
+            self._record_ledger_departures(ledger_partners)
+        return res
+
+    def unlink(self):
+        Ledger = self.env['tt.partner.ledger']
+        Ledger._ledger_lines_changed(self)
+        Ledger._record_tombstones(list(self._partner_ledger_partners().items()))
+        return super().unlink()
+
+    def _partner_ledger_partners(self):
+        """ Partner id of the lines in a partner ledger, by line id """
+        return {
+            line.id: line.partner_id.id for line in self
+            if line.partner_id and line.partner_ledger_account_type in LEDGER_ACCOUNT_TYPES
+        }
+
+    def _record_ledger_departures(self, ledger_partners):
+        """ Record tombstones for the lines that left the ledger they were in
+        according to ``ledger_partners``, a :meth:`_partner_ledger_partners`
+        result from before a change: moved to another partner or out of the
+        receivable/payable accounts. Unlinked lines are left to :meth:`unlink`.
+        """
+        lines = self.exists()
+        current = lines._partner_ledger_partners()
+        self.env['tt.partner.ledger']._record_tombstones([
+            (line_id, partner_id) for line_id, partner_id in ledger_partners.items()
+            if line_id in lines._ids and current.get(line_id) != partner_id
+        ])
+
+    def _auto_init(self):
+        # Fill the new column with one UPDATE instead of a per-record
+        # recompute of the related field on install
+        if not column_exists(self.env.cr, 'account_move_line', 'partner_ledger_account_type'):
+            create_column(self.env.cr, 'account_move_line', 'partner_ledger_account_type', 'varchar')
+            self.env.cr.execute("""
+                UPDATE account_move_line aml
+                   SET partner_ledger_account_type = acc.account_type
+                  FROM account_account acc
+                 WHERE acc.id = aml.account_id
+            """)
+        return super()._auto_init()
+
+    def init(self):
+        super().init()
+        self._partner_ledger_init_ledger_index()
+        self._partner_ledger_init_sync_index()
+        self._partner_ledger_init_trigram_indexes()
+
+    def _partner_ledger_init_ledger_index(self):
+        """ Composite index serving every ledger query as a range scan.
+
+        It is restricted to receivable/payable lines and covers the amounts,
+        so counts and balance sums are answered by index-only scans and pages
+        are read in (date, id) order without sorting.
+        """
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS partner_ledger_aml_partner_date_idx
+                ON account_move_line (partner_id, date, id)
+                INCLUDE (debit, credit, balance)
+                WHERE partner_ledger_account_type IN %s
+        """, [LEDGER_ACCOUNT_TYPES])
+
+    def _partner_ledger_init_sync_index(self):
+        """ Index reading a partner's ledger lines in (write_date, id) order, for the sync API """
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS partner_ledger_aml_partner_write_date_idx
+                ON account_move_line (partner_id, write_date, id)
+                WHERE partner_ledger_account_type IN %s
+        """, [LEDGER_ACCOUNT_TYPES])
+
+    def _partner_ledger_init_trigram_indexes(self):
+        """ Create the GIN trigram indexes used by the ledger search, unless an equivalent one exists """
+        cr = self.env.cr
+        cr.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if not cr.fetchone():
+            try:
+                with cr.savepoint():
+                    cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            except psycopg2.Error:
+                _logger.warning("pg_trgm is not available, the ledger search will not use trigram indexes")
+                return
+        for index_name, table, column in LEDGER_TRIGRAM_INDEXES:
+            cr.execute("""
+                SELECT 1
+                  FROM pg_indexes
+                 WHERE tablename = %s
+                   AND indexdef ILIKE '%%USING gin%%'
+                   AND indexdef ILIKE %s
+            """, [table, f'%({column} gin_trgm_ops)%'])
+            if cr.fetchone():
+                continue
+            _logger.info("Creating trigram index %s on %s(%s)", index_name, table, column)
+            cr.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table}" USING gin ("{column}" gin_trgm_ops)')
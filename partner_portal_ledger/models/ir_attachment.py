@@ -0,0 +1,48 @@
+import hashlib
+import os
+import shutil
+
+from odoo import api, models
+
+# Bytes read at once when hashing or copying a file into the filestore
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    @api.model
+    def _partner_ledger_create_from_file(self, fileobj, vals):
+        """ Create an attachment from ``vals`` holding the content of
+        ``fileobj``, an open binary file.
+
+        With the file storage the file is hashed and copied into the
+        filestore by chunks, so an export of any size is never held in
+        memory; the database storage has to read it at once.
+        """
+        fileobj.seek(0)
+        if self._storage() != 'file':
+            return self.create(dict(vals, raw=fileobj.read()))
+        sha1 = hashlib.sha1()
+        size = 0
+        for chunk in iter(lambda: fileobj.read(COPY_CHUNK_SIZE), b''):
+            sha1.update(chunk)
+            size += len(chunk)
+        checksum = sha1.hexdigest()
+        fname = f'{checksum[:2]}/{checksum}'
+        full_path = self._full_path(fname)
+        if not os.path.isfile(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            fileobj.seek(0)
+            with open(full_path, 'wb') as target:
+                shutil.copyfileobj(fileobj, target, COPY_CHUNK_SIZE)
+            # removed by the filestore GC if the transaction rolls back
+            self._mark_for_gc(fname)
+        attachment = self.create(vals)
+        attachment.flush_recordset()
+        # create() ignores these fields, they are computed from the content it is given
+        self.env.cr.execute("""
+            UPDATE ir_attachment SET store_fname = %s, file_size = %s, checksum = %s WHERE id = %s
+        """, [fname, size, checksum, attachment.id])
+        attachment.invalidate_recordset(['store_fname', 'file_size', 'checksum'])
+        return attachment
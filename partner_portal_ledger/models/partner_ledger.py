@@ -0,0 +1,1041 @@
+import collections
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from odoo import api, models
+from odoo.modules.registry import Registry
+
+from .. import exporters
+from ..instrumentation import timed
+from ..ledger_cache import ledger_cached
+
+_logger = logging.getLogger(__name__)
+
+LEDGER_ACCOUNT_TYPES = ('asset_receivable', 'asset_payable')
+GROUP_BY_OPTIONS = ('none', 'day', 'month', 'year')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_BATCH_SIZE = 2000
+# The portal home shows "1000+" past this many lines
+PORTAL_COUNT_CAP = 1000
+DEFAULT_SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 10000
+# Removed lines are reported for this long; older sync cursors are refused
+SYNC_TOMBSTONE_RETENTION = timedelta(days=90)
+# First key of the advisory locks serializing _apply_pending_changes per partner
+LEDGER_LOCK_KEY = 0x4c47
+# Change markers still pending after this long are applied by the cron
+CHANGE_APPLY_DELAY = timedelta(minutes=1)
+# Applied change markers older than this are compacted, see _gc_ledger_changes
+CHANGE_RETENTION = timedelta(days=1)
+
+# account_move is LEFT JOINed so PostgreSQL drops the join from the queries
+# that do not read the move name, e.g. counts and balance sums
+LEDGER_FROM = """
+    account_move_line aml
+    LEFT JOIN account_move am ON am.id = aml.move_id
+"""
+
+LedgerFilters = collections.namedtuple('LedgerFilters', ['date_from', 'date_to', 'search_term', 'group_by'])
+LedgerRow = collections.namedtuple('LedgerRow', ['id', 'date', 'move_name', 'name', 'debit', 'credit', 'balance', 'running_balance', 'group_date'])
+LedgerGroup = collections.namedtuple('LedgerGroup', ['group_date', 'debit', 'credit', 'net', 'count'])
+
+
+def _ledger_row(values, seed, descending):
+    """ :class:`LedgerRow` of a row of :meth:`TTPartnerLedger._rows_query`,
+    whose running balance is ``seed`` moved by the row's cumulated balance:
+    ``seed`` is the running balance at the first row when descending, just
+    before it when ascending.
+    """
+    line_id, date, move_name, name, debit, credit, balance, cumulated, group_date = values
+    running_balance = seed - cumulated + balance if descending else seed + cumulated
+    return LedgerRow(line_id, date, move_name, name, debit, credit, balance, running_balance, group_date)
+
+
+class TTPartnerLedger(models.AbstractModel):
+    _name = 'tt.partner.ledger'
+    _description = 'TT Partner Ledger Queries'
+
+    def init(self):
+        # Markers of the transactions that changed a partner's ledger, see
+        # _log_ledger_changes; the snapshot cells they mark (month) are
+        # recomputed once they are applied
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS partner_ledger_change (
+                id bigserial PRIMARY KEY,
+                partner_id integer NOT NULL,
+                month date,
+                changed_at timestamp without time zone NOT NULL DEFAULT (clock_timestamp() at time zone 'utc'),
+                applied boolean NOT NULL DEFAULT false
+            );
+            ALTER TABLE partner_ledger_change ADD COLUMN IF NOT EXISTS month date;
+            ALTER TABLE partner_ledger_change ADD COLUMN IF NOT EXISTS applied boolean NOT NULL DEFAULT true;
+            ALTER TABLE partner_ledger_change ALTER COLUMN applied SET DEFAULT false;
+            CREATE INDEX IF NOT EXISTS partner_ledger_change_partner_idx
+                ON partner_ledger_change (partner_id, id) INCLUDE (changed_at);
+            CREATE INDEX IF NOT EXISTS partner_ledger_change_pending_idx
+                ON partner_ledger_change (partner_id) WHERE NOT applied;
+        """)
+        # Lines that left a partner's ledger, see _sync_changes
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS partner_ledger_tombstone (
+                partner_id integer NOT NULL,
+                line_id integer NOT NULL,
+                deleted_at timestamp without time zone NOT NULL DEFAULT (now() at time zone 'utc')
+            );
+            CREATE INDEX IF NOT EXISTS partner_ledger_tombstone_partner_idx
+                ON partner_ledger_tombstone (partner_id, deleted_at, line_id);
+        """)
+
+    @api.model
+    def _ledger_generation(self, partner):
+        """ Ledger generation of ``partner`` seen by this transaction, used in
+        the cache keys, or None if the transaction changed the partner's
+        ledger itself and must bypass the cache.
+
+        The generation is the latest change marker of the partner and the
+        number of its markers: markers are numbered when they are inserted,
+        not when they commit, so a transaction committing a lower number than
+        the latest one still changes the count.
+        """
+        changes = self.env.cr.postcommit.data.get('partner_ledger.changes')
+        if changes and partner.id in changes['partners']:
+            return None
+        generations = self.env.cr.precommit.data.setdefault('partner_ledger.generations', {})
+        if partner.id not in generations:
+            self.env.cr.execute("""
+                SELECT COALESCE(MAX(id), 0), COUNT(*) FROM partner_ledger_change WHERE partner_id = %s
+            """, [partner.id])
+            generations[partner.id] = self.env.cr.fetchone()
+        return generations[partner.id]
+
+    @api.model
+    def _pending_ledger_changes(self):
+        """ Ledger changes of the transaction: the partners whose cached
+        results are stale and the snapshot ``(partner_id, month)`` cells to
+        recompute, the month-end statements of these months on being stale.
+
+        They are logged as change markers right before the commit by
+        :meth:`_log_ledger_changes`, and applied once it has committed by
+        :meth:`_apply_ledger_changes`.
+        """
+        cr = self.env.cr
+        if 'partner_ledger.changes' not in cr.postcommit.data:
+            cr.postcommit.data['partner_ledger.changes'] = {
+                'partners': set(), 'cells': set(), 'logged': set(),
+            }
+            cr.postcommit.add(self._apply_ledger_changes)
+        if 'partner_ledger.log' not in cr.precommit.data:
+            # precommit callbacks and their data are cleared once run, so a
+            # change made after a flush registers the logging again
+            cr.precommit.data['partner_ledger.log'] = True
+            cr.precommit.add(self._log_ledger_changes)
+        return cr.postcommit.data['partner_ledger.changes']
+
+    @api.model
+    def _invalidate_ledger_cache(self, partners):
+        """ Make the cached results of ``partners`` unreachable once the transaction has committed """
+        if partners:
+            self._pending_ledger_changes()['partners'].update(partners.ids)
+
+    @api.model
+    def _ledger_lines_changed(self, lines):
+        """ Called with the journal items about to change and once more after
+        the change: invalidates the cached results of their partners, marks
+        their monthly snapshots for recomputation and drops the month-end
+        statements they appear in.
+        """
+        self._invalidate_ledger_cache(lines.partner_id)
+        self.env['tt.partner.ledger.snapshot']._mark_dirty(lines)
+
+    def _log_ledger_changes(self):
+        """ Insert a change marker per snapshot cell changed by the transaction
+        (one without month for a partner without cell), as part of it.
+
+        The markers are the only invalidation signal that must not be lost:
+        they commit or roll back with the lines, and being inserted, never
+        updated, they cannot make concurrent postings of a partner conflict.
+        The partner's latest marker gives its cache generation, and markers
+        not yet applied mark its snapshot cells and statements as stale.
+        """
+        changes = self.env.cr.postcommit.data.get('partner_ledger.changes')
+        if not changes:
+            return
+        markers = set(changes['cells'])
+        with_cells = {partner_id for partner_id, _month in markers}
+        markers.update((partner_id, None) for partner_id in changes['partners'] - with_cells)
+        markers -= changes['logged']
+        if not markers:
+            return
+        changes['logged'].update(markers)
+        partner_ids, months = zip(*markers)
+        self.env.cr.execute("""
+            INSERT INTO partner_ledger_change (partner_id, month)
+                 SELECT * FROM unnest(%s::int[], %s::date[])
+        """, [list(partner_ids), list(months)])
+
+    def _apply_ledger_changes(self):
+        """ Apply the change markers of the partners changed by the committed
+        transaction, see :meth:`_apply_pending_changes`.
+
+        This runs after the commit, in a READ COMMITTED transaction of its
+        own: the snapshot cells and statements are shared by all the postings
+        of a partner, and writing them in the business transaction, which
+        Odoo runs in REPEATABLE READ, made concurrent postings for the same
+        partner fail on commit with serialization errors.
+
+        If it fails, the error is logged and nothing is lost: the markers
+        stay pending, so readers keep ignoring the partner's cells, and the
+        cron applies them on its next run.
+        """
+        changes = self.env.cr.postcommit.data.get('partner_ledger.changes')
+        if not changes or not changes['partners']:
+            return
+        partner_ids = sorted(changes['partners'])
+        try:
+            with self._read_committed_cursor() as cr:
+                self.with_env(self.env(cr=cr, su=True))._apply_pending_changes(partner_ids)
+        except Exception:
+            _logger.exception("Could not apply the ledger changes of partners %s", partner_ids)
+
+    @api.model
+    def _read_committed_cursor(self):
+        """ Cursor of a new READ COMMITTED transaction on the database.
+
+        In test mode the registry's cursors share the test transaction,
+        whose isolation level cannot change any more, so it is left as is.
+        """
+        cr = Registry(self.env.cr.dbname).cursor()
+        if not self.env.registry.in_test_mode():
+            cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        return cr
+
+    @api.model
+    def _apply_pending_changes(self, partner_ids):
+        """ Recompute the snapshot cells and drop the stale statements of the
+        pending change markers of ``partner_ids``, then mark them applied.
+
+        Must run in a READ COMMITTED transaction. An advisory lock per
+        partner orders concurrent runs; the markers are claimed before the
+        lines are read, so every line of a claimed marker is seen.
+        """
+        cr = self.env.cr
+        # sorted, so concurrent runs take the locks in the same order
+        partner_ids = sorted(partner_ids)
+        cr.execute("SELECT pg_advisory_xact_lock(%s, partner_id) FROM unnest(%s::int[]) AS partner_id",
+                   [LEDGER_LOCK_KEY, partner_ids])
+        cr.execute("""
+            UPDATE partner_ledger_change SET applied = true
+             WHERE partner_id = ANY(%s) AND NOT applied
+         RETURNING partner_id, month
+        """, [partner_ids])
+        cells = {(partner_id, month) for partner_id, month in cr.fetchall() if month}
+        if not cells:
+            return
+        stale = {}
+        for partner_id, month in cells:
+            stale[partner_id] = min(stale.get(partner_id, month), month)
+        self.env['tt.partner.ledger.snapshot']._recompute_cells(
+            [partner_id for partner_id, _month in cells], [month for _partner_id, month in cells])
+        self.env['tt.partner.ledger.statement']._drop_stale(stale)
+
+    @api.model
+    def _pending_partner_ids(self, partner_ids):
+        """ Those of ``partner_ids`` with change markers not applied yet """
+        self.env.cr.execute("""
+            SELECT DISTINCT partner_id FROM partner_ledger_change WHERE partner_id = ANY(%s) AND NOT applied
+        """, [list(partner_ids)])
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _cron_apply_ledger_changes(self):
+        """ Apply the change markers left pending by failed postcommit runs """
+        self.env.cr.execute("""
+            SELECT DISTINCT partner_id FROM partner_ledger_change
+             WHERE NOT applied AND changed_at < %s
+        """, [datetime.utcnow() - CHANGE_APPLY_DELAY])
+        partner_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not partner_ids:
+            return
+        _logger.warning("Applying the pending ledger changes of %s partners", len(partner_ids))
+        with self._read_committed_cursor() as cr:
+            self.with_env(self.env(cr=cr, su=True))._apply_pending_changes(partner_ids)
+
+    @api.model
+    def _gc_ledger_changes(self):
+        """ Keep only the latest applied change marker of each partner.
+
+        The removed markers of a partner are replaced by a new one, so its
+        generation changes. The table is locked against the postings while
+        doing so, otherwise a marker numbered lower than the latest one could
+        commit while others are removed and leave the generation as it was;
+        the cleanup is skipped if the lock is not granted quickly.
+        """
+        with self._read_committed_cursor() as cr:
+            cr.execute("SET LOCAL lock_timeout = '5s'")
+            try:
+                cr.execute("LOCK TABLE partner_ledger_change IN SHARE MODE")
+            except psycopg2.errors.LockNotAvailable:
+                _logger.info("Ledger change log busy, not cleaned up")
+                return
+            cr.execute("""
+                WITH removed AS (
+                    DELETE FROM partner_ledger_change c
+                     WHERE c.applied
+                       AND c.changed_at < %s
+                       AND EXISTS (SELECT 1 FROM partner_ledger_change n WHERE n.partner_id = c.partner_id AND n.id > c.id)
+                 RETURNING c.partner_id, c.changed_at
+                )
+                INSERT INTO partner_ledger_change (partner_id, changed_at, applied)
+                     SELECT partner_id, MAX(changed_at), true FROM removed GROUP BY partner_id
+            """, [datetime.utcnow() - CHANGE_RETENTION])
+
+    @api.model
+    def _last_modified(self, partner):
+        """ Last change to the partner's ledger: the latest write on its lines
+        or their entries, or its latest change marker if later, as unlinked
+        lines leave no write_date behind; or to the partner itself, whose
+        name and address are on the pages and exports.
+        """
+        dates = [self._last_change(partner, self._normalize_filters()), partner.write_date]
+        return max(filter(None, dates), default=None)
+
+    @api.model
+    @timed('fetch')
+    @ledger_cached
+    def _last_change(self, partner, filters):
+        """ :meth:`_last_modified`, cached under the empty filters """
+        where, params = self._where_clause(partner, filters)
+        self._flush_ledger()
+        self.env.cr.execute(f"""
+            SELECT GREATEST(
+                (SELECT MAX(GREATEST(aml.write_date, am.write_date)) FROM {LEDGER_FROM} WHERE {where}),
+                (SELECT MAX(changed_at) FROM partner_ledger_change WHERE partner_id = %s)
+            )
+        """, params + [partner.id])
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _ledger_etag(self, partner, *parts):
+        """ Strong validator of a ledger response, from the partner's ledger
+        generation and last change (see :meth:`_last_modified`) plus whatever
+        else the response depends on (filters, format, date format, ...).
+        """
+        validator = (partner.id, self._ledger_generation(partner), self._last_modified(partner)) + parts
+        return hashlib.sha256(repr(validator).encode()).hexdigest()
+
+    @api.model
+    def _record_tombstones(self, removed):
+        """ Record that the lines of the ``(line_id, partner_id)`` pairs left
+        their partner's ledger, unlinked or moved to another partner or account
+        """
+        # the same departure may be seen by both the entry's and the line's write
+        recorded = self.env.cr.postcommit.data.setdefault('partner_ledger.tombstones', set())
+        removed = set(removed) - recorded
+        if not removed:
+            return
+        recorded.update(removed)
+        line_ids, partner_ids = zip(*removed)
+        self.env.cr.execute("""
+            INSERT INTO partner_ledger_tombstone (line_id, partner_id)
+                 SELECT * FROM unnest(%s::int[], %s::int[])
+        """, [list(line_ids), list(partner_ids)])
+
+    @api.model
+    def _gc_tombstones(self):
+        self.env.cr.execute("""
+            DELETE FROM partner_ledger_tombstone WHERE deleted_at < %s
+        """, [datetime.utcnow() - SYNC_TOMBSTONE_RETENTION])
+
+    @api.model
+    def _parse_sync_cursor(self, value):
+        """ Decode a ``<write_date>_<id>`` sync cursor.
+
+        :raise ValueError: if the cursor is invalid
+        """
+        changed_at, line_id = value.split('_', 1)
+        return datetime.fromisoformat(changed_at), int(line_id)
+
+    @api.model
+    def _sync_changes(self, partner, cursor=None, limit=DEFAULT_SYNC_LIMIT):
+        """ Ledger lines of ``partner`` created, changed or removed after ``cursor``.
+
+        Changes are ordered by ``(write_date, id)``, removals by the time the
+        line left the ledger and its id, so both follow one keyset cursor.
+        Changes stamped at or after the start of the oldest transaction still
+        running are held back, see :meth:`_sync_horizon`.
+
+        Returns ``(changes, next_cursor, has_more)``, changes being dicts with
+        an ``op`` of ``upsert`` or ``delete``. Without changes, the next cursor
+        is the horizon.
+        """
+        until = self._sync_horizon()
+        after = cursor or (datetime.min, 0)
+        self._flush_ledger()
+        self.env.cr.execute(f"""
+            WITH changes AS (
+                (SELECT aml.write_date AS changed_at, aml.id AS line_id, 'upsert' AS op
+                   FROM account_move_line aml
+                  WHERE aml.partner_id = %(partner)s
+                    AND aml.partner_ledger_account_type IN %(types)s
+                    AND (aml.write_date, aml.id) > (%(after_at)s, %(after_id)s)
+                    AND aml.write_date < %(until)s
+               ORDER BY aml.write_date, aml.id
+                  LIMIT %(limit)s)
+              UNION ALL
+                (SELECT t.deleted_at, t.line_id, 'delete'
+                   FROM partner_ledger_tombstone t
+                  WHERE t.partner_id = %(partner)s
+                    AND (t.deleted_at, t.line_id) > (%(after_at)s, %(after_id)s)
+                    AND t.deleted_at < %(until)s
+               ORDER BY t.deleted_at, t.line_id
+                  LIMIT %(limit)s)
+            )
+            SELECT c.op, c.changed_at, c.line_id, aml.date, am.name, aml.name, aml.debit, aml.credit, aml.balance
+              FROM changes c
+         LEFT JOIN ({LEDGER_FROM}) ON c.op = 'upsert' AND aml.id = c.line_id
+          ORDER BY c.changed_at, c.line_id
+             LIMIT %(limit)s
+        """, {
+            'partner': partner.id,
+            'types': LEDGER_ACCOUNT_TYPES,
+            'after_at': after[0],
+            'after_id': after[1],
+            'until': until,
+            'limit': limit + 1,
+        })
+        rows = self.env.cr.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        changes = []
+        for op, changed_at, line_id, date, move_name, name, debit, credit, balance in rows:
+            change = {'op': op, 'id': line_id, 'changed_at': changed_at.isoformat()}
+            if op == 'upsert':
+                change.update(date=date.isoformat(), move_name=move_name, name=name,
+                              debit=debit, credit=credit, balance=balance)
+            changes.append(change)
+        if rows:
+            last = (rows[-1][1], rows[-1][2])
+        else:
+            # every change before ``until`` has been sent: move the cursor up,
+            # so a quiet ledger does not outlive the tombstone retention
+            last = max((until, 0), after)
+        return changes, f"{last[0].isoformat()}_{last[1]}", has_more
+
+    @api.model
+    def _sync_horizon(self):
+        """ Start of the oldest client transaction running on the database.
+
+        A transaction stamps its writes and tombstones with its start time,
+        so one still running may commit changes older than any cursor handed
+        out now, but never older than its start: every change before the
+        horizon is final. This transaction is one of them, so the horizon is
+        never later than its own start.
+
+        Only client backends holding a transaction id or a snapshot count:
+        autovacuum and other background processes never write the ledger,
+        and a session that has neither has not read or written anything yet.
+        A session left idle in a transaction still holds the horizon back,
+        as it may commit at any time; ``idle_in_transaction_session_timeout``
+        bounds how long. The module's own long crons commit as they go, see
+        ``tt.partner.ledger.batch`` and ``tt.partner.ledger.statement``.
+
+        Transactions of other database roles are only seen by a role allowed
+        to read their activity (e.g. ``pg_read_all_stats``), and transactions
+        on other servers, such as a primary seen from a replica, not at all:
+        the sync must run on the primary, with the role writing the ledger.
+        """
+        self.env.cr.execute("""
+            SELECT LEAST(MIN(xact_start), transaction_timestamp()) AT TIME ZONE 'utc'
+              FROM pg_stat_activity
+             WHERE datname = current_database()
+               AND backend_type = 'client backend'
+               AND xact_start IS NOT NULL
+               AND (backend_xid IS NOT NULL OR backend_xmin IS NOT NULL)
+        """)
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _ledger_accounts_changed(self, accounts):
+        """ Called before the type of ``accounts`` changes: the lines of the
+        partners on these accounts are about to enter or leave their ledgers.
+
+        Related stored fields are recomputed without going through the lines'
+        ``write``, so the lines are handled here with plain queries, as an
+        account may have millions of them.
+        """
+        self.env['account.move.line'].flush_model(['account_id', 'partner_id', 'date', 'partner_ledger_account_type'])
+        self.env.cr.execute("""
+            SELECT DISTINCT partner_id, date_trunc('month', date)::date
+              FROM account_move_line
+             WHERE account_id = ANY(%s) AND partner_id IS NOT NULL
+        """, [accounts.ids])
+        cells = self.env.cr.fetchall()
+        if cells:
+            changes = self._pending_ledger_changes()
+            changes['partners'].update(partner_id for partner_id, _month in cells)
+            changes['cells'].update(cells)
+        leaving = accounts.filtered(lambda account: account.account_type in LEDGER_ACCOUNT_TYPES)
+        if leaving:
+            self.env.cr.execute("""
+                INSERT INTO partner_ledger_tombstone (line_id, partner_id)
+                     SELECT id, partner_id
+                       FROM account_move_line
+                      WHERE account_id = ANY(%s)
+                        AND partner_id IS NOT NULL
+                        AND partner_ledger_account_type IN %s
+            """, [leaving.ids, LEDGER_ACCOUNT_TYPES])
+
+    @api.model
+    def _normalize_filters(self, date_from=None, date_to=None, search_term='', group_by='none'):
+        """ Drop unparsable dates and unknown groupings from raw request values """
+        dates = []
+        for value in (date_from, date_to):
+            try:
+                dates.append(datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d') if value else None)
+            except ValueError:
+                dates.append(None)
+        if group_by not in GROUP_BY_OPTIONS:
+            group_by = 'none'
+        return LedgerFilters(dates[0], dates[1], (search_term or '').strip(), group_by)
+
+    @api.model
+    def _partner_clause(self, partner, alias):
+        """ Clause selecting the ledger lines of ``partner`` (one or several
+        partners) over the ``alias`` alias of account_move_line
+        """
+        if len(partner) == 1:
+            clause, params = f"{alias}.partner_id = %s", [partner.id]
+        else:
+            clause, params = f"{alias}.partner_id = ANY(%s)", [partner.ids]
+        return f"{clause} AND {alias}.partner_ledger_account_type IN %s", params + [LEDGER_ACCOUNT_TYPES]
+
+    @api.model
+    def _where_clause(self, partner, filters, with_dates=True):
+        """ WHERE clause selecting the ledger lines of ``partner`` (one or
+        several partners), over the ``aml``/``am`` aliases
+        """
+        clause, params = self._partner_clause(partner, 'aml')
+        clauses = [clause]
+        if with_dates and filters.date_from:
+            clauses.append("aml.date >= %s")
+            params.append(filters.date_from)
+        if with_dates and filters.date_to:
+            clauses.append("aml.date <= %s")
+            params.append(filters.date_to)
+        if filters.search_term:
+            clauses.append(self._search_clause(partner, filters.search_term, params))
+        return " AND ".join(clauses), params
+
+    @api.model
+    def _search_clause(self, partner, search_term, params):
+        """ Clause matching ``search_term`` in the line label or the move name,
+        its parameters being appended to ``params``.
+
+        An OR between the two cannot use an index, the move name side being
+        on another table. Each side is a branch of its own instead, one the
+        planner can answer from the partner and trigram indexes on the line
+        label, the other by joining the partner's lines with the moves whose
+        name matches, starting from either side; lines matching both are
+        returned twice, which does not matter to the semi-join.
+        """
+        pattern = f'%{search_term}%'
+        clause, partner_params = self._partner_clause(partner, 'l')
+        params += partner_params + [pattern] + partner_params + [pattern]
+        return f"""aml.id IN (
+            SELECT l.id FROM account_move_line l
+             WHERE {clause} AND l.name ILIKE %s
+         UNION ALL
+            SELECT l.id FROM account_move_line l JOIN account_move m ON m.id = l.move_id
+             WHERE {clause} AND m.name ILIKE %s
+        )"""
+
+    @api.model
+    def _flush_ledger(self):
+        self.env['account.move.line'].flush_model([
+            'date', 'name', 'debit', 'credit', 'balance', 'partner_id', 'partner_ledger_account_type', 'move_id',
+        ])
+        self.env['account.move'].flush_model(['name'])
+
+    @api.model
+    def _keyset_clause(self, cursor, older, inclusive=False):
+        """ Rows before (older=True) or after the (date, id) cursor """
+        op = ('<' if older else '>') + ('=' if inclusive else '')
+        return f"(aml.date, aml.id) {op} (%s, %s)", list(cursor)
+
+    @api.model
+    @ledger_cached
+    def _fetch_rows(self, partner, filters, cursor=None, older=True, descending=True, limit=None, boundary=None):
+        """ :meth:`_read_rows`, cached, for the page-sized reads of the portal.
+
+        Exports stream through :meth:`_iter_rows`, which reads uncached: one
+        large ledger would otherwise fill the cache with its batches and
+        evict everything else.
+        """
+        return self._read_rows(partner, filters, cursor=cursor, older=older, descending=descending,
+                               limit=limit, boundary=boundary)
+
+    @api.model
+    @timed('fetch', rows=True)
+    def _read_rows(self, partner, filters, cursor=None, older=True, descending=True, limit=None, boundary=None):
+        """ Read the ledger columns of the matching lines as :class:`LedgerRow` tuples.
+
+        This is the only place the routes read line data from: one query
+        projecting exactly the displayed columns, the move name included,
+        instead of browsing records and walking ``move_id`` row by row.
+
+        ``running_balance`` is seeded with ``boundary``: the running balance
+        just before the first row when ascending, or at the first row when
+        descending. When not given it is computed with
+        :meth:`_running_boundary`. ``group_date`` is the first day of the
+        row's day/month/year group.
+        """
+        if boundary is None:
+            boundary = self._running_boundary(partner, filters, cursor=cursor, descending=descending)
+        query, params = self._rows_query(partner, filters, cursor=cursor, older=older, descending=descending)
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+        self._flush_ledger()
+        self.env.cr.execute(query, params)
+        return [_ledger_row(row, boundary, descending) for _partner_id, *row in self.env.cr.fetchall()]
+
+    @api.model
+    def _rows_query(self, partners, filters, cursor=None, older=True, descending=True):
+        """ Query of the rows of :meth:`_read_rows` and :meth:`_iter_partners_rows`,
+        each one led by its partner id and ordered by partner.
+
+        Instead of the running balance, each row has the sum of the
+        balances of its partner's rows up to it, a window sum over the rows
+        in their order; :func:`_ledger_row` adds it to the seed of the
+        partner. ``cursor`` restricts the rows to those before (``older``)
+        or after that (date, id) cursor.
+        """
+        where, params = self._where_clause(partners, filters)
+        if cursor:
+            keyset, keyset_params = self._keyset_clause(cursor, older)
+            where = f"{where} AND {keyset}"
+            params += keyset_params
+        if filters.group_by == 'none':
+            group_date, group_params = "NULL::date", []
+        else:
+            group_date, group_params = "date_trunc(%s, aml.date::timestamp)::date", [filters.group_by]
+        direction = 'DESC' if descending else 'ASC'
+        query = f"""
+            SELECT aml.partner_id, aml.id, aml.date, am.name, aml.name, aml.debit, aml.credit, aml.balance,
+                   SUM(aml.balance) OVER (PARTITION BY aml.partner_id
+                                          ORDER BY aml.date {direction}, aml.id {direction}
+                                          ROWS UNBOUNDED PRECEDING),
+                   {group_date}
+              FROM {LEDGER_FROM}
+             WHERE {where}
+          ORDER BY aml.partner_id, aml.date {direction}, aml.id {direction}
+        """
+        return query, group_params + params
+
+    @api.model
+    def _running_boundary(self, partner, filters, cursor=None, descending=True, opening_balance=None):
+        """ Seed for the running balance of a batch starting right after ``cursor`` """
+        if opening_balance is None:
+            opening_balance = self._opening_balance(partner, filters)
+        if descending:
+            # running balance of the newest row of the batch: everything up to it
+            return opening_balance + self._sum_balance(partner, filters, until=cursor)
+        if not cursor:
+            return opening_balance
+        # running balance just before the batch: everything up to the cursor
+        return opening_balance + self._sum_balance(partner, filters, until=cursor, inclusive=True)
+
+    @api.model
+    def _iter_rows(self, partner, filters, descending=True, batch_size=DEFAULT_BATCH_SIZE, opening_balance=None):
+        """ Yield every matching row, fetching ``batch_size`` rows at a time by keyset.
+
+        The running balance is carried from one batch to the next, so only
+        the first batch needs a balance aggregate.
+        """
+        cursor = None
+        boundary = self._running_boundary(partner, filters, descending=descending, opening_balance=opening_balance)
+        while True:
+            rows = self._read_rows(partner, filters, cursor=cursor, older=descending,
+                                   descending=descending, limit=batch_size, boundary=boundary)
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]
+            cursor = (last.date, last.id)
+            boundary = last.running_balance - last.balance if descending else last.running_balance
+
+    @api.model
+    @timed('fetch')
+    @ledger_cached
+    def _group_totals(self, partner, filters, first=None, last=None, descending=True):
+        """ Debit, credit, net and count per day/month/year group, aggregated by the database.
+
+        ``first`` and ``last`` optionally restrict the result to the groups
+        starting between those two group dates.
+        """
+        totals = self._partners_group_totals(partner, filters, first=first, last=last, descending=descending)
+        return list(totals[partner.id].values())
+
+    @api.model
+    def _get_summary(self, partner, filters):
+        """ Group subtotals only, for a collapsed view that never reads the lines themselves """
+        groups = self._group_totals(partner, filters)
+        opening_balance = self._opening_balance(partner, filters)
+        return {
+            'groups': groups,
+            'count': sum(group.count for group in groups),
+            'opening_balance': opening_balance,
+            'closing_balance': opening_balance + sum(group.net for group in groups),
+        }
+
+    @api.model
+    @timed('fetch')
+    @ledger_cached
+    def _count(self, partner, filters):
+        where, params = self._where_clause(partner, filters)
+        self._flush_ledger()
+        self.env.cr.execute(f"SELECT COUNT(*) FROM {LEDGER_FROM} WHERE {where}", params)
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    @timed('fetch')
+    @ledger_cached
+    def _count_capped(self, partner, filters, cap=PORTAL_COUNT_CAP):
+        """ Count the matching lines, stopping at ``cap + 1``, so the cost of
+        the portal home counter does not grow with the partner's history.
+        """
+        where, params = self._where_clause(partner, filters)
+        self._flush_ledger()
+        self.env.cr.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {LEDGER_FROM} WHERE {where} LIMIT %s) lines",
+            params + [cap + 1],
+        )
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    @timed('fetch')
+    @ledger_cached
+    def _sum_balance(self, partner, filters, until=None, inclusive=False):
+        """ Balance of the matching lines, optionally only those before the ``until`` cursor """
+        return self._sum_balances(partner, filters, until=until, inclusive=inclusive)[partner.id]
+
+    @api.model
+    @timed('fetch')
+    @ledger_cached
+    def _opening_balance(self, partner, filters):
+        """ Balance of the matching lines dated before ``date_from``, see :meth:`_opening_balances` """
+        return self._opening_balances(partner, filters)[partner.id]
+
+    @api.model
+    def _date_format(self):
+        lang = self.env['res.lang'].search([('code', '=', self.env.user.lang or 'en_US')], limit=1)
+        return lang.date_format if lang else '%Y-%m-%d'
+
+    @api.model
+    def _group_label(self, group_date, group_by, date_format):
+        return exporters.group_label(group_date, group_by, date_format)
+
+    @api.model
+    def _get_exporter(self, fmt, partner, filters, date_format=None):
+        """ Build the exporter of ``fmt`` over the partner's ledger.
+
+        Rows are handed over as a lazy batch iterator; the group subtotals
+        and the opening balance are computed up front as single aggregates.
+        """
+        exporter_class = exporters.get_exporter(fmt)
+        descending = exporter_class.descending
+        opening_balance = self._opening_balance(partner, filters)
+        return exporter_class(
+            rows=self._iter_rows(partner, filters, descending=descending, opening_balance=opening_balance),
+            groups={group.group_date: group for group in self._group_totals(partner, filters, descending=descending)},
+            opening_balance=opening_balance,
+            filters=filters,
+            date_format=date_format or self._date_format(),
+            title=f"Customer Ledger - {partner.name}",
+        )
+
+    @api.model
+    def _sum_balances(self, partners, filters, until=None, inclusive=False):
+        """ :meth:`_sum_balance` of several partners at once, by partner id """
+        where, params = self._where_clause(partners, filters)
+        if until:
+            keyset, keyset_params = self._keyset_clause(until, older=True, inclusive=inclusive)
+            where = f"{where} AND {keyset}"
+            params += keyset_params
+        self._flush_ledger()
+        self.env.cr.execute(f"""
+            SELECT aml.partner_id, SUM(aml.balance) FROM {LEDGER_FROM} WHERE {where} GROUP BY aml.partner_id
+        """, params)
+        balances = dict.fromkeys(partners.ids, 0.0)
+        balances.update(self.env.cr.fetchall())
+        return balances
+
+    @api.model
+    def _opening_balances(self, partners, filters):
+        """ Balance of the matching lines of each of ``partners`` dated before
+        ``date_from``, by partner id.
+
+        Without a search term, the monthly snapshots give the balance up to
+        the start of ``date_from``'s month, and only the lines of that month
+        before ``date_from`` are summed; otherwise, or for the partners whose
+        snapshots are not usable, all earlier lines are summed as one
+        aggregate.
+        """
+        if not filters.date_from:
+            return dict.fromkeys(partners.ids, 0.0)
+        Snapshot = self.env['tt.partner.ledger.snapshot']
+        snapshot_partners = partners.browse()
+        if not filters.search_term and Snapshot._is_ready():
+            snapshot_partners = partners - partners.browse(Snapshot._dirty_partner_ids(partners))
+        where, params = self._where_clause(partners, filters, with_dates=False)
+        since = datetime.strptime(filters.date_from, '%Y-%m-%d').date().replace(day=1)
+        if snapshot_partners == partners:
+            where += " AND aml.date >= %s"
+            params.append(since)
+        elif snapshot_partners:
+            where += " AND (aml.date >= %s OR aml.partner_id != ALL(%s))"
+            params += [since, snapshot_partners.ids]
+        query = f"SELECT aml.partner_id, aml.balance FROM {LEDGER_FROM} WHERE {where} AND aml.date < %s"
+        params.append(filters.date_from)
+        if snapshot_partners:
+            query += """
+             UNION ALL
+                SELECT partner_id, balance
+                  FROM tt_partner_ledger_snapshot
+                 WHERE partner_id = ANY(%s) AND month < %s
+            """
+            params += [snapshot_partners.ids, since]
+        self._flush_ledger()
+        self.env.cr.execute(f"SELECT partner_id, SUM(balance) FROM ({query}) balances GROUP BY partner_id", params)
+        balances = dict.fromkeys(partners.ids, 0.0)
+        balances.update(self.env.cr.fetchall())
+        return balances
+
+    @api.model
+    def _partners_group_totals(self, partners, filters, first=None, last=None, descending=True):
+        """ :meth:`_group_totals` of several partners at once, as dicts of
+        ``LedgerGroup`` by group date, by partner id
+        """
+        totals = {partner_id: {} for partner_id in partners.ids}
+        if filters.group_by == 'none':
+            return totals
+        where, params = self._where_clause(partners, filters)
+        if first:
+            where += " AND aml.date >= %s"
+            params.append(first)
+        if last:
+            where += " AND aml.date < %s::date + %s::interval"
+            params += [last, f'1 {filters.group_by}']
+        direction = 'DESC' if descending else 'ASC'
+        self._flush_ledger()
+        self.env.cr.execute(f"""
+            SELECT aml.partner_id, date_trunc(%s, aml.date::timestamp)::date,
+                   SUM(aml.debit), SUM(aml.credit), SUM(aml.balance), COUNT(*)
+              FROM {LEDGER_FROM}
+             WHERE {where}
+          GROUP BY 1, 2
+          ORDER BY 1, 2 {direction}
+        """, [filters.group_by] + params)
+        for partner_id, *group in self.env.cr.fetchall():
+            totals[partner_id][group[0]] = LedgerGroup._make(group)
+        return totals
+
+    @api.model
+    def _iter_partners_rows(self, partners, filters, opening_balances, descending=True,
+                            batch_size=DEFAULT_BATCH_SIZE):
+        """ Yield ``(partner_id, rows)`` for each of ``partners`` having
+        matching lines, by increasing partner id.
+
+        The rows of all the partners come from a single query, see
+        :meth:`_rows_query`, the running balances being seeded from
+        ``opening_balances``. The query is read through a server-side cursor
+        ``batch_size`` rows at a time, so only one partner's rows are held
+        in memory at once.
+        """
+        seeds = opening_balances
+        if descending:
+            # newest rows first: seeded with the running balance at the newest row
+            totals = self._sum_balances(partners, filters)
+            seeds = {partner_id: opening_balances[partner_id] + totals[partner_id] for partner_id in partners.ids}
+        query, params = self._rows_query(partners, filters, descending=descending)
+        cr = self.env.cr
+        self._flush_ledger()
+        cr.execute(f"DECLARE partner_ledger_rows NO SCROLL CURSOR FOR {query}", params)
+        current, rows = None, []
+        while True:
+            cr.execute("FETCH %s FROM partner_ledger_rows", [batch_size])
+            batch = cr.fetchall()
+            for partner_id, *row in batch:
+                if partner_id != current:
+                    if rows:
+                        yield current, rows
+                    current, rows = partner_id, []
+                rows.append(_ledger_row(row, seeds[partner_id], descending))
+            if len(batch) < batch_size:
+                break
+        # left open if the caller stops early, until the transaction ends
+        cr.execute("CLOSE partner_ledger_rows")
+        if rows:
+            yield current, rows
+
+    @api.model
+    def _parse_page_size(self, value):
+        """ Clamp the requested page size; 0 asks for every row on a single page """
+        try:
+            page_size = int(value)
+        except (TypeError, ValueError):
+            return DEFAULT_PAGE_SIZE
+        if page_size == 0:
+            return 0
+        return min(max(page_size, 1), MAX_PAGE_SIZE)
+
+    @api.model
+    def _parse_cursor(self, value):
+        """ Decode a ``<date>_<id>`` keyset cursor, or return None if invalid """
+        if not value:
+            return None
+        try:
+            date_str, line_id = value.split('_', 1)
+            return datetime.strptime(date_str, '%Y-%m-%d').date(), int(line_id)
+        except ValueError:
+            return None
+
+    @api.model
+    def _make_cursor(self, row):
+        return f"{row.date.strftime('%Y-%m-%d')}_{row.id}"
+
+    @api.model
+    def _get_page(self, partner, filters, after=None, before=None, limit=DEFAULT_PAGE_SIZE):
+        """ Fetch one page of ledger rows, newest first, using a (date, id) keyset.
+
+        ``after`` continues towards older lines, ``before`` goes back towards
+        newer ones. Each page only reads ``limit + 1`` rows whatever its depth,
+        plus a count and the balance aggregate seeding the running balance,
+        which the database can answer from an index. ``carried_balance`` is
+        the running balance just below the page's oldest row.
+
+        With ``limit=0`` every row is returned on one page, as a lazy iterator
+        fetching batches by keyset, so it must be consumed only once.
+        """
+        after = self._parse_cursor(after)
+        before = self._parse_cursor(before)
+
+        opening_balance = self._opening_balance(partner, filters)
+        if not limit:
+            return {
+                'rows': self._iter_rows(partner, filters, opening_balance=opening_balance),
+                'groups': self._group_totals(partner, filters),
+                'count': self._count(partner, filters),
+                'opening_balance': opening_balance,
+                'carried_balance': opening_balance,
+                'next_cursor': None,
+                'prev_cursor': None,
+            }
+        rows, next_cursor, prev_cursor = self._page_rows(partner, filters, after, before, limit, opening_balance)
+
+        carried_balance = rows[-1].running_balance - rows[-1].balance if rows else opening_balance
+        groups = []
+        if rows and filters.group_by != 'none':
+            groups = self._group_totals(partner, filters, first=rows[-1].group_date, last=rows[0].group_date)
+
+        return {
+            'rows': rows,
+            'groups': groups,
+            'count': self._count(partner, filters),
+            'opening_balance': opening_balance,
+            'carried_balance': carried_balance,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
+        }
+
+    @api.model
+    def _page_rows(self, partner, filters, after, before, limit, opening_balance):
+        """ Rows of the page next to the parsed ``after``/``before`` cursor, newest
+        first, with the cursors of the neighbouring pages (None at either end).
+        """
+        if before:
+            boundary = self._running_boundary(partner, filters, cursor=before, descending=False,
+                                              opening_balance=opening_balance)
+            rows = self._fetch_rows(partner, filters, cursor=before, older=False, descending=False,
+                                    limit=limit + 1, boundary=boundary)
+            has_prev = len(rows) > limit
+            rows = rows[:limit][::-1]
+            has_next = True
+        else:
+            boundary = self._running_boundary(partner, filters, cursor=after, descending=True,
+                                              opening_balance=opening_balance)
+            rows = self._fetch_rows(partner, filters, cursor=after, older=True, descending=True,
+                                    limit=limit + 1, boundary=boundary)
+            has_next = len(rows) > limit
+            rows = rows[:limit]
+            has_prev = bool(after)
+        return (
+            rows,
+            self._make_cursor(rows[-1]) if rows and has_next else None,
+            self._make_cursor(rows[0]) if rows and has_prev else None,
+        )
+
+    @api.model
+    def _get_window(self, partner, filters, after=None, before=None, limit=DEFAULT_PAGE_SIZE, summary=False):
+        """ One window of ledger rows for the portal's virtual table, as columnar arrays.
+
+        Each column is a single list, so the payload does not repeat the keys
+        of every row. The count, the opening balance and the group subtotals
+        do not depend on the window: they are only computed and sent with the
+        first one, which is the one requested without cursor.
+        """
+        after = self._parse_cursor(after)
+        before = self._parse_cursor(before)
+        limit = limit or DEFAULT_PAGE_SIZE
+        date_format = self._date_format()
+        first = not (after or before)
+
+        opening_balance = self._opening_balance(partner, filters)
+        rows, next_cursor, prev_cursor = [], None, None
+        if not summary:
+            rows, next_cursor, prev_cursor = self._page_rows(partner, filters, after, before, limit, opening_balance)
+        if not first:
+            return self._window_values(filters, date_format, rows, next_cursor, prev_cursor)
+        groups = self._group_totals(partner, filters)
+        count = sum(group.count for group in groups) if summary else self._count(partner, filters)
+        return self._window_values(filters, date_format, rows, next_cursor, prev_cursor,
+                                   count=count, opening_balance=opening_balance, groups=groups)
+
+    @api.model
+    def _window_values(self, filters, date_format, rows, next_cursor, prev_cursor,
+                       count=None, opening_balance=None, groups=None):
+        """ Columnar payload of a window, see :meth:`_get_window`; the totals
+        are only included when ``count`` is given, for a first window.
+        """
+        result = {
+            'rows': {
+                'id': [row.id for row in rows],
+                'date': [row.date.strftime(date_format) for row in rows],
+                'move_name': [row.move_name or '' for row in rows],
+                'name': [row.name or '' for row in rows],
+                'debit': [row.debit for row in rows],
+                'credit': [row.credit for row in rows],
+                'running_balance': [row.running_balance for row in rows],
+                'group_date': [row.group_date and row.group_date.isoformat() for row in rows],
+            },
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
+        }
+        if count is not None:
+            result.update({
+                'count': count,
+                'opening_balance': opening_balance,
+                'groups': {
+                    'group_date': [group.group_date.isoformat() for group in groups],
+                    'label': [self._group_label(group.group_date, filters.group_by, date_format) for group in groups],
+                    'debit': [group.debit for group in groups],
+                    'credit': [group.credit for group in groups],
+                    'net': [group.net for group in groups],
+                    'count': [group.count for group in groups],
+                },
+            })
+        return result
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.modules.registry import Registry
+
+
+class TTPartnerLedgerBackgroundMixin(models.AbstractModel):
+    """ Work queued for a cron worker: export jobs and ledger batches.
+
+    Records are claimed one at a time with ``FOR UPDATE SKIP LOCKED``, so
+    several cron workers never run the same one. Once claimed, a record is
+    only read through the cron's cursor, while every change to it (state,
+    progress, results) is committed through a short-lived cursor of its own,
+    so its progress is seen as it happens and the two transactions never
+    write the same row.
+    """
+    _name = 'tt.partner.ledger.background.mixin'
+    _description = 'TT Partner Ledger Background Work'
+
+    # Running records not finished after this long are considered lost (worker killed)
+    _background_timeout = timedelta(hours=2)
+    _background_lost_error = "The work was interrupted."
+    # (done, total) fields the progress is computed from
+    _progress_fields = ()
+
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], required=True, default='pending', index=True, readonly=True)
+    started_at = fields.Datetime(readonly=True)
+    done_at = fields.Datetime(readonly=True)
+    progress = fields.Integer(compute='_compute_progress')
+    error = fields.Text(readonly=True)
+
+    @api.depends(lambda self: ('state',) + self._progress_fields)
+    def _compute_progress(self):
+        done_field, total_field = self._progress_fields
+        for record in self:
+            if record.state == 'done':
+                record.progress = 100
+            elif record[total_field]:
+                record.progress = min(99, record[done_field] * 100 // record[total_field])
+            else:
+                record.progress = 0
+
+    def _set_status(self, **vals):
+        """ Write ``vals`` on the record and commit them at once, in a cursor of their own """
+        with Registry(self.env.cr.dbname).cursor() as cr:
+            self.with_env(self.env(cr=cr)).write(vals)
+
+    def _start_values(self):
+        """ Values written on the record when a worker claims it """
+        return {'state': 'running', 'started_at': fields.Datetime.now()}
+
+    def _run(self):
+        raise NotImplementedError()
+
+    @api.model
+    def _fail_lost(self):
+        now = fields.Datetime.now()
+        lost = self.search([('state', '=', 'running'), ('started_at', '<', now - self._background_timeout)])
+        lost.write({'state': 'failed', 'done_at': now, 'error': self._background_lost_error})
+
+    @api.model
+    def _run_pending(self, limit):
+        """ Run up to ``limit`` pending records, oldest first """
+        self._fail_lost()
+        for _i in range(limit):
+            self.env.cr.execute(f"""
+                SELECT id FROM "{self._table}"
+                 WHERE state = 'pending'
+              ORDER BY id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+            """)
+            row = self.env.cr.fetchone()
+            if not row:
+                return
+            record = self.browse(row[0])
+            record.write(record._start_values())
+            # release the row: from now on the record is only written by _set_status
+            self.env.cr.commit()
+            record._run()
+            self.env.cr.commit()
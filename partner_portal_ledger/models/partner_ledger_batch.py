@@ -0,0 +1,264 @@
+import collections
+import io
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.modules.registry import Registry
+from odoo.tools import split_every
+
+from .. import exporters
+from .partner_ledger import GROUP_BY_OPTIONS
+
+_logger = logging.getLogger(__name__)
+
+# Number of rendering processes, 1 to render in the cron worker itself
+BATCH_WORKERS_PARAM = 'partner_portal_ledger.batch_workers'
+DEFAULT_BATCH_WORKERS = min(4, os.cpu_count() or 1)
+# Ledgers queued per rendering process, bounding the rows held in memory
+QUEUED_PER_WORKER = 2
+# Partners read in one transaction, the cron's transaction is committed between parts
+PARTNERS_PER_TRANSACTION = 500
+# A ZIP archive is split into parts of about this many bytes
+ZIP_PART_SIZE_PARAM = 'partner_portal_ledger.zip_part_size'
+DEFAULT_ZIP_PART_SIZE = 100 * 1024 * 1024
+# Formats whose files are compressed already, stored as is in archives
+PRECOMPRESSED_FORMATS = ('pdf', 'xlsx', 'parquet')
+
+
+class _InlineExecutor:
+    """ Stand-in for a process pool, rendering in the current process """
+
+    def submit(self, function, *args, **kwargs):
+        future = Future()
+        future.set_result(function(*args, **kwargs))
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class TTPartnerLedgerBatch(models.Model):
+    """ Ledgers of many partners generated at once by a cron worker.
+
+    The rows of all the partners are read with a single query partitioned by
+    partner (see ``tt.partner.ledger._iter_partners_rows``), and each
+    partner's file is rendered by a pool of processes while the next
+    partners' rows are read. Like export jobs, batches are run as described
+    on ``tt.partner.ledger.background.mixin``, so their progress can be
+    followed from the batch form.
+    """
+    _name = 'tt.partner.ledger.batch'
+    _inherit = 'tt.partner.ledger.background.mixin'
+    _description = 'TT Partner Ledger Batch'
+    _order = 'id desc'
+    _background_timeout = timedelta(hours=12)
+    _background_lost_error = "The batch was interrupted."
+    _progress_fields = ('partners_done', 'partner_count')
+
+    name = fields.Char(compute='_compute_name')
+    user_id = fields.Many2one('res.users', required=True, default=lambda self: self.env.user, readonly=True)
+    partner_ids = fields.Many2many('res.partner', string='Partners', required=True, readonly=True)
+    fmt = fields.Char(string='Format', required=True, readonly=True)
+    date_from = fields.Date(readonly=True)
+    date_to = fields.Date(readonly=True)
+    group_by = fields.Selection([(option, option.capitalize()) for option in GROUP_BY_OPTIONS],
+                                required=True, default='none', readonly=True)
+    date_format = fields.Char(required=True, default='%Y-%m-%d', readonly=True)
+    output = fields.Selection([
+        ('combined', 'One combined file'),
+        ('per_partner', 'One file per partner'),
+        ('zip', 'ZIP archive'),
+    ], required=True, default='per_partner', readonly=True)
+    partner_count = fields.Integer(readonly=True)
+    partners_done = fields.Integer(readonly=True)
+    attachment_ids = fields.Many2many('ir.attachment', string='Files', readonly=True)
+    last_partner_id = fields.Integer(readonly=True, help="Partners up to this id are in the saved archive "
+                                                         "parts, a retried ZIP batch resumes after it")
+
+    @api.depends('fmt', 'partner_ids')
+    def _compute_name(self):
+        for batch in self:
+            batch.name = f"{(batch.fmt or '').upper()} ledgers of {len(batch.partner_ids)} partners"
+
+    def _filters(self):
+        self.ensure_one()
+        return self.env['tt.partner.ledger']._normalize_filters(
+            fields.Date.to_string(self.date_from), fields.Date.to_string(self.date_to), '', self.group_by)
+
+    @api.model
+    def _cron_run_batches(self, limit=5):
+        """ Run up to ``limit`` pending batches, oldest first """
+        self._run_pending(limit)
+
+    def _start_values(self):
+        return dict(super()._start_values(), partner_count=len(self.partner_ids))
+
+    def _executor(self):
+        workers = int(self.env['ir.config_parameter'].sudo().get_param(BATCH_WORKERS_PARAM, DEFAULT_BATCH_WORKERS))
+        if workers <= 1:
+            return _InlineExecutor(), 1
+        # forked children only render plain values, they never use the
+        # inherited database connections
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')), workers
+
+    def action_retry(self):
+        """ Run failed batches again; ZIP batches resume after their last saved part """
+        self.filtered(lambda batch: batch.state == 'failed').write({'state': 'pending', 'error': False})
+        self.env.ref('partner_portal_ledger.ir_cron_ledger_batches')._trigger()
+
+    def _run(self):
+        self.ensure_one()
+        try:
+            if self.output == 'zip':
+                self._write_zip_parts()
+            else:
+                files = self._render_files()
+                self._save_files(files)
+        except Exception as e:
+            _logger.exception("Ledger batch %s failed", self.id)
+            self._set_status(state='failed', done_at=fields.Datetime.now(), error=str(e))
+
+    def _render_files(self):
+        """ Return the ``(partner, title, bytes)`` of every partner's ledger, by partner id """
+        step = max(1, len(self.partner_ids) // 100)
+        files = []
+        for file in self._render_parts(self.partner_ids, self.fmt, self._filters(), self.date_format):
+            files.append(file)
+            if len(files) % step == 0:
+                self._set_status(partners_done=len(files))
+        return files
+
+    def _write_zip_parts(self):
+        """ Write the ledgers into ZIP archives, one member per partner.
+
+        Members are compressed into a temporary file as soon as they are
+        rendered, so only the ledgers queued in the pool are in memory. When
+        the archive passes the part size it is saved as an attachment and
+        committed with the last partner it holds, and the next members go
+        to a new part; a failed batch retried later resumes from there.
+        """
+        max_size = int(self.env['ir.config_parameter'].sudo().get_param(ZIP_PART_SIZE_PARAM, DEFAULT_ZIP_PART_SIZE))
+        compression = zipfile.ZIP_STORED if self.fmt in PRECOMPRESSED_FORMATS else zipfile.ZIP_DEFLATED
+        partners = self.partner_ids.filtered(lambda partner: partner.id > self.last_partner_id)
+        partners_done = len(self.partner_ids) - len(partners)
+        step = max(1, len(self.partner_ids) // 100)
+        part = archive = None
+        for partner, title, data in self._render_parts(partners, self.fmt, self._filters(), self.date_format):
+            if archive is None:
+                part = tempfile.TemporaryFile()
+                archive = zipfile.ZipFile(part, 'w', compression=compression, allowZip64=True)
+            member = re.sub(r'[\\/:*?"<>|]+', '_', f'{partner.id} {title}.{self.fmt}')
+            archive.writestr(member, data)
+            partners_done += 1
+            if part.tell() >= max_size:
+                archive.close()
+                self._save_zip_part(part, partner, partners_done)
+                part = archive = None
+            elif partners_done % step == 0:
+                self._set_status(partners_done=partners_done)
+        if archive is not None:
+            archive.close()
+            self._save_zip_part(part, partner, partners_done)
+        self._set_status(state='done', done_at=fields.Datetime.now(), partners_done=partners_done)
+
+    def _save_zip_part(self, part, last_partner, partners_done):
+        with part, Registry(self.env.cr.dbname).cursor() as cr:
+            env = self.env(cr=cr)
+            batch = self.with_env(env)
+            attachment = env['ir.attachment']._partner_ledger_create_from_file(part, {
+                'name': f'customer_ledgers_{len(batch.attachment_ids) + 1:03d}.zip',
+                'mimetype': 'application/zip',
+                'res_model': self._name,
+                'res_id': self.id,
+            })
+            batch.write({
+                'attachment_ids': [(4, attachment.id)],
+                'last_partner_id': last_partner.id,
+                'partners_done': partners_done,
+            })
+
+    @api.model
+    def _render_parts(self, partners, fmt, filters, date_format):
+        """ :meth:`_render_ledgers` of ``partners``, :data:`PARTNERS_PER_TRANSACTION`
+        at a time, committing the cron's transaction after each part.
+
+        A long batch would otherwise hold back the sync horizon (see
+        ``tt.partner.ledger._sync_horizon``) until it is over. Every ledger
+        is read in one transaction, those of different parts may not be.
+        """
+        for part in split_every(PARTNERS_PER_TRANSACTION, partners.sorted('id').ids, partners.browse):
+            yield from self._render_ledgers(part, fmt, filters, date_format)
+            self.env.cr.commit()
+
+    @api.model
+    def _render_ledgers(self, partners, fmt, filters, date_format):
+        """ Render the ledgers of ``partners`` in a pool of processes,
+        yielding ``(partner, title, bytes)`` by partner id.
+        """
+        Ledger = self.env['tt.partner.ledger']
+        exporter_class = exporters.get_exporter(fmt)
+        partners = partners.sorted('id')
+        opening_balances = Ledger._opening_balances(partners, filters)
+        groups = Ledger._partners_group_totals(partners, filters, descending=exporter_class.descending)
+        rows_by_partner = Ledger._iter_partners_rows(
+            partners, filters, opening_balances, descending=exporter_class.descending)
+        next_rows = next(rows_by_partner, None)
+
+        executor, workers = self._executor()
+        pending = collections.deque()
+        with executor:
+            for partner in partners:
+                rows = []
+                if next_rows and next_rows[0] == partner.id:
+                    rows = next_rows[1]
+                    next_rows = next(rows_by_partner, None)
+                title = f"Customer Ledger - {partner.name}"
+                pending.append((partner, title, executor.submit(
+                    exporters.render, fmt,
+                    rows=rows,
+                    groups=groups[partner.id],
+                    opening_balance=opening_balances[partner.id],
+                    filters=filters,
+                    date_format=date_format,
+                    title=title,
+                )))
+                # wait for the oldest ledger once enough are queued
+                while len(pending) > workers * QUEUED_PER_WORKER:
+                    partner, title, future = pending.popleft()
+                    yield partner, title, future.result()
+            while pending:
+                partner, title, future = pending.popleft()
+                yield partner, title, future.result()
+
+    def _save_files(self, files):
+        exporter_class = exporters.get_exporter(self.fmt)
+        with Registry(self.env.cr.dbname).cursor() as cr:
+            env = self.env(cr=cr)
+            if self.output == 'combined':
+                output = io.BytesIO()
+                exporter_class.combine([(title, data) for _partner, title, data in files], output)
+                values = [{'name': f'customer_ledgers.{self.fmt}', 'raw': output.getvalue()}]
+            else:
+                values = [{'name': f'{title}.{self.fmt}', 'raw': data} for _partner, title, data in files]
+            attachments = env['ir.attachment'].create([dict(
+                vals,
+                mimetype=exporter_class.content_type,
+                res_model=self._name,
+                res_id=self.id,
+            ) for vals in values])
+            self.with_env(env).write({
+                'state': 'done',
+                'done_at': fields.Datetime.now(),
+                'partners_done': len(files),
+                'attachment_ids': [(6, 0, attachments.ids)],
+            })
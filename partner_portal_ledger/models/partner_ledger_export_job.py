@@ -0,0 +1,171 @@
+import logging
+import tempfile
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import api, fields, models
+from odoo.modules.registry import Registry
+
+from .partner_ledger import GROUP_BY_OPTIONS
+
+_logger = logging.getLogger(__name__)
+
+# Rows between two progress updates of a running job
+PROGRESS_STEP = 2000
+# Finished jobs and their files are removed after this long
+JOB_RETENTION = timedelta(days=1)
+
+
+class TTPartnerLedgerExportJob(models.Model):
+    """ Ledger export rendered in the background by a cron worker.
+
+    The portal queues a job and polls its status; identical pending or
+    running jobs of the same user are shared, see :meth:`_enqueue`. Jobs
+    are run and report their progress as described on
+    ``tt.partner.ledger.background.mixin``.
+    """
+    _name = 'tt.partner.ledger.export.job'
+    _inherit = 'tt.partner.ledger.background.mixin'
+    _description = 'TT Partner Ledger Export Job'
+    _order = 'id desc'
+    _background_timeout = timedelta(hours=2)
+    _background_lost_error = "The export was interrupted."
+    _progress_fields = ('rows_done', 'row_count')
+
+    partner_id = fields.Many2one('res.partner', required=True, ondelete='cascade', index=True)
+    user_id = fields.Many2one('res.users', required=True, ondelete='cascade')
+    fmt = fields.Char(string='Format', required=True)
+    date_from = fields.Date()
+    date_to = fields.Date()
+    search_term = fields.Char()
+    group_by = fields.Selection([(option, option.capitalize()) for option in GROUP_BY_OPTIONS],
+                                required=True, default='none')
+    date_format = fields.Char(required=True, default='%Y-%m-%d')
+    row_count = fields.Integer()
+    rows_done = fields.Integer()
+    attachment_id = fields.Many2one('ir.attachment', ondelete='set null')
+
+    def init(self):
+        # At most one pending or running job per user and export request
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS tt_partner_ledger_export_job_pending_uniq
+                ON tt_partner_ledger_export_job (
+                    partner_id, user_id, fmt,
+                    COALESCE(date_from, '-infinity'::date), COALESCE(date_to, 'infinity'::date),
+                    COALESCE(search_term, ''), group_by
+                )
+                WHERE state IN ('pending', 'running')
+        """)
+
+    def _filters(self):
+        self.ensure_one()
+        return self.env['tt.partner.ledger']._normalize_filters(
+            fields.Date.to_string(self.date_from), fields.Date.to_string(self.date_to),
+            self.search_term, self.group_by)
+
+    def _pending_domain(self, partner, user, fmt, filters):
+        return [
+            ('partner_id', '=', partner.id),
+            ('user_id', '=', user.id),
+            ('fmt', '=', fmt),
+            ('date_from', '=', filters.date_from or False),
+            ('date_to', '=', filters.date_to or False),
+            ('search_term', '=', filters.search_term or False),
+            ('group_by', '=', filters.group_by),
+            ('state', 'in', ('pending', 'running')),
+        ]
+
+    @api.model
+    def _enqueue(self, partner, user, fmt, filters, date_format):
+        """ Queue an export of the partner's ledger and return the job id.
+
+        An identical job still pending or running is reused, so repeated
+        clicks on Export render the file once. When a concurrent request
+        queued the same job first, the unique index rejects this one and
+        the other job is looked up in a new transaction, the current one
+        being unable to see it.
+        """
+        domain = self._pending_domain(partner, user, fmt, filters)
+        job = self.search(domain, limit=1)
+        if job:
+            return job.id
+        try:
+            with self.env.cr.savepoint():
+                job = self.create({
+                    'partner_id': partner.id,
+                    'user_id': user.id,
+                    'fmt': fmt,
+                    'date_from': filters.date_from,
+                    'date_to': filters.date_to,
+                    'search_term': filters.search_term or False,
+                    'group_by': filters.group_by,
+                    'date_format': date_format,
+                })
+        except psycopg2.errors.UniqueViolation:
+            with Registry(self.env.cr.dbname).cursor() as cr:
+                return self.with_env(self.env(cr=cr)).search(domain, limit=1).id
+        self.env.ref('partner_portal_ledger.ir_cron_ledger_export_jobs')._trigger()
+        return job.id
+
+    def _status(self):
+        self.ensure_one()
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'progress': self.progress,
+            'rows_done': self.rows_done,
+            'row_count': self.row_count,
+            'error': self.error or None,
+            'download_url': f'/my/ledger/export/job/{self.id}/download' if self.state == 'done' else None,
+        }
+
+    @api.model
+    def _cron_run_export_jobs(self, limit=10):
+        """ Run up to ``limit`` pending jobs, oldest first """
+        self._gc_export_jobs()
+        self._run_pending(limit)
+
+    def _run(self):
+        self.ensure_one()
+        Ledger = self.env['tt.partner.ledger']
+        try:
+            filters = self._filters()
+            partner = self.partner_id
+            row_count = Ledger._count(partner, filters)
+            self._set_status(row_count=row_count)
+            exporter = Ledger._get_exporter(self.fmt, partner, filters, self.date_format)
+            exporter.rows = self._track_progress(exporter.rows)
+            with tempfile.TemporaryFile() as output, Registry(self.env.cr.dbname).cursor() as cr:
+                exporter.write(output)
+                env = self.env(cr=cr)
+                attachment = env['ir.attachment']._partner_ledger_create_from_file(output, {
+                    'name': f'customer_ledger.{self.fmt}',
+                    'mimetype': exporter.content_type,
+                    'res_model': self._name,
+                    'res_id': self.id,
+                })
+                self.with_env(env).write({
+                    'state': 'done',
+                    'done_at': fields.Datetime.now(),
+                    'rows_done': row_count,
+                    'attachment_id': attachment.id,
+                })
+        except Exception as e:
+            _logger.exception("Ledger export job %s failed", self.id)
+            self._set_status(state='failed', done_at=fields.Datetime.now(), error=str(e))
+
+    def _track_progress(self, rows):
+        rows_done = 0
+        for row in rows:
+            yield row
+            rows_done += 1
+            if rows_done % PROGRESS_STEP == 0:
+                self._set_status(rows_done=rows_done)
+
+    @api.model
+    def _gc_export_jobs(self):
+        now = fields.Datetime.now()
+        expired = self.search([('state', 'in', ('done', 'failed')), ('done_at', '<', now - JOB_RETENTION)])
+        expired.attachment_id.unlink()
+        expired.unlink()
@@ -1,7 +1,62 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools.safe_eval import safe_eval
+
+from .. import exporters
+from .partner_ledger import GROUP_BY_OPTIONS
+
 
 class TTPartnerLedgerWizard(models.TransientModel):
     _name = 'tt.partner.ledger.wizard'
     _description = 'TT Partner Ledger Wizard'
 
-    partner_id = fields.Many2one('res.partner', string="Partner", required=True)
+    partner_ids = fields.Many2many('res.partner', string="Partners",
+                                   help="Leave empty to take the partners matching the domain")
+    partner_domain = fields.Char(string="Partner Domain", default="[]")
+    date_from = fields.Date()
+    date_to = fields.Date()
+    fmt = fields.Selection([(fmt, fmt.upper()) for fmt in exporters.EXPORTERS], string="Format",
+                           required=True, default='pdf')
+    group_by = fields.Selection([(option, option.capitalize()) for option in GROUP_BY_OPTIONS],
+                                required=True, default='none')
+    output = fields.Selection([
+        ('combined', 'One combined file'),
+        ('per_partner', 'One file per partner'),
+        ('zip', 'ZIP archive'),
+    ], required=True, default='per_partner')
+
+    def _partners(self):
+        self.ensure_one()
+        if self.partner_ids:
+            return self.partner_ids
+        return self.env['res.partner'].search(safe_eval(self.partner_domain or '[]'))
+
+    def action_generate(self):
+        """ Queue a batch generating the ledgers and open it """
+        self.ensure_one()
+        if not exporters.is_available(self.fmt):
+            raise UserError(_("The %s format is not available on this server.", self.fmt.upper()))
+        if self.output == 'combined' and not exporters.get_exporter(self.fmt).combinable:
+            raise UserError(_("%s ledgers cannot be combined into one file.", self.fmt.upper()))
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise UserError(_("The start date must be before the end date."))
+        partners = self._partners()
+        if not partners:
+            raise UserError(_("No partner selected."))
+        batch = self.env['tt.partner.ledger.batch'].create({
+            'partner_ids': [(6, 0, partners.ids)],
+            'fmt': self.fmt,
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'group_by': self.group_by,
+            'date_format': self.env['tt.partner.ledger']._date_format(),
+            'output': self.output,
+        })
+        self.env.ref('partner_portal_ledger.ir_cron_ledger_batches')._trigger()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': batch._name,
+            'res_id': batch.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
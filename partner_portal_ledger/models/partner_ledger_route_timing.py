@@ -0,0 +1,47 @@
+from odoo import api, fields, models
+
+
+class TTPartnerLedgerRouteTiming(models.Model):
+    """ Duration histograms of the ledger routes.
+
+    One record per route and duration bucket, holding the number of requests
+    whose duration fell in the bucket and the totals of their metrics, see
+    ``instrumentation``. Workers merge their in-memory histograms into this
+    table every minute; averages are computed from the totals.
+    """
+    _name = 'tt.partner.ledger.route.timing'
+    _description = 'TT Partner Ledger Route Timing'
+    _order = 'route, bucket'
+    _log_access = False
+
+    route = fields.Char(required=True, readonly=True)
+    bucket = fields.Integer(readonly=True, help="Index of the duration bucket, see instrumentation.BUCKETS_MS")
+    bucket_label = fields.Char(string='Duration', readonly=True)
+    count = fields.Integer(string='Requests', readonly=True)
+    duration = fields.Float(string='Total Duration (ms)', readonly=True)
+    sql_time = fields.Float(string='SQL Time (ms)', readonly=True)
+    fetch_time = fields.Float(string='Fetch Time (ms)', readonly=True)
+    render_time = fields.Float(string='Render Time (ms)', readonly=True)
+    query_count = fields.Integer(string='Queries', readonly=True)
+    cache_hits = fields.Integer(readonly=True)
+    cache_misses = fields.Integer(readonly=True)
+    rows = fields.Integer(readonly=True)
+    bytes = fields.Float(readonly=True)
+    avg_duration = fields.Float(string='Avg Duration (ms)', compute='_compute_averages')
+    avg_queries = fields.Float(compute='_compute_averages')
+    avg_bytes = fields.Float(compute='_compute_averages')
+    cache_hit_rate = fields.Float(string='Cache Hit Rate (%)', compute='_compute_averages')
+
+    _sql_constraints = [
+        ('route_bucket_uniq', 'unique(route, bucket)', "One histogram bucket per route and duration."),
+    ]
+
+    @api.depends('count', 'duration', 'query_count', 'bytes', 'cache_hits', 'cache_misses')
+    def _compute_averages(self):
+        for record in self:
+            count = record.count or 1
+            record.avg_duration = record.duration / count
+            record.avg_queries = record.query_count / count
+            record.avg_bytes = record.bytes / count
+            lookups = record.cache_hits + record.cache_misses
+            record.cache_hit_rate = record.cache_hits * 100 / lookups if lookups else 0.0
@@ -0,0 +1,145 @@
+import logging
+
+from odoo import api, fields, models
+
+from .partner_ledger import LEDGER_ACCOUNT_TYPES
+
+_logger = logging.getLogger(__name__)
+
+# Set once the cron has filled and checked the snapshots against the lines
+SNAPSHOTS_READY_PARAM = 'partner_portal_ledger.snapshots_verified_at'
+
+
+class TTPartnerLedgerSnapshot(models.Model):
+    """ Monthly totals of each partner's receivable/payable lines.
+
+    A cell holds the debit, credit and balance of the partner's ledger lines
+    dated in ``month``, so the balance at the start of any month is the sum
+    of the cells before it, and an opening balance only has to add the lines
+    of the current month before ``date_from``.
+
+    Cells are kept up to date by the journal item and entry hooks, which log
+    a change marker for each (partner, month) cell they touch; the marked
+    cells are recomputed from the lines right after the transaction commits,
+    or by the cron if that fails, see
+    ``tt.partner.ledger._apply_pending_changes``. A partner's cells are not
+    used while it has pending markers. The cron backfills the table on
+    install and then verifies it against the lines.
+    """
+    _name = 'tt.partner.ledger.snapshot'
+    _description = 'TT Partner Ledger Monthly Snapshot'
+    _order = 'partner_id, month'
+    _log_access = False
+
+    partner_id = fields.Many2one('res.partner', required=True, ondelete='cascade', index=True)
+    month = fields.Date(required=True, help="First day of the month")
+    debit = fields.Float()
+    credit = fields.Float()
+    balance = fields.Float()
+    line_count = fields.Integer()
+
+    _sql_constraints = [
+        ('partner_month_uniq', 'unique(partner_id, month)', "One snapshot per partner and month."),
+    ]
+
+    @api.model
+    def _is_ready(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param(SNAPSHOTS_READY_PARAM))
+
+    @api.model
+    def _mark_dirty(self, lines):
+        """ Recompute the cells of ``lines`` once the transaction has committed """
+        cells = {(line.partner_id.id, line.date.replace(day=1)) for line in lines if line.partner_id and line.date}
+        if cells:
+            self.env['tt.partner.ledger']._pending_ledger_changes()['cells'].update(cells)
+
+    @api.model
+    def _dirty_partner_ids(self, partners):
+        """ Those of ``partners`` whose cells were changed and not recomputed
+        yet, by this transaction or by a committed one whose change markers
+        are still pending
+        """
+        changes = self.env.cr.postcommit.data.get('partner_ledger.changes')
+        dirty = {partner_id for partner_id, _month in changes['cells']} & set(partners.ids) if changes else set()
+        return dirty | self.env['tt.partner.ledger']._pending_partner_ids(partners.ids)
+
+    @api.model
+    def _is_dirty(self, partner):
+        return bool(self._dirty_partner_ids(partner))
+
+    @api.model
+    def _recompute_cells(self, partner_ids, months):
+        """ Recompute the (partner, month) cells from the lines, dropping the empty ones """
+        cr = self.env.cr
+        cells = "SELECT * FROM unnest(%s::int[], %s::date[]) AS c(partner_id, month)"
+        cr.execute(f"""
+            INSERT INTO tt_partner_ledger_snapshot AS s (partner_id, month, debit, credit, balance, line_count)
+                 SELECT c.partner_id, c.month, SUM(aml.debit), SUM(aml.credit), SUM(aml.balance), COUNT(*)
+                   FROM ({cells}) c
+                   JOIN account_move_line aml
+                     ON aml.partner_id = c.partner_id
+                    AND aml.date >= c.month
+                    AND aml.date < c.month + interval '1 month'
+                    AND aml.partner_ledger_account_type IN %s
+               GROUP BY c.partner_id, c.month
+            ON CONFLICT (partner_id, month) DO UPDATE
+                    SET debit = EXCLUDED.debit, credit = EXCLUDED.credit,
+                        balance = EXCLUDED.balance, line_count = EXCLUDED.line_count
+        """, [partner_ids, months, LEDGER_ACCOUNT_TYPES])
+        cr.execute(f"""
+            DELETE FROM tt_partner_ledger_snapshot s
+                  USING ({cells}) c
+                  WHERE s.partner_id = c.partner_id
+                    AND s.month = c.month
+                    AND NOT EXISTS (
+                        SELECT 1 FROM account_move_line aml
+                         WHERE aml.partner_id = c.partner_id
+                           AND aml.date >= c.month
+                           AND aml.date < c.month + interval '1 month'
+                           AND aml.partner_ledger_account_type IN %s
+                    )
+        """, [partner_ids, months, LEDGER_ACCOUNT_TYPES])
+
+    @api.model
+    def _cron_verify_snapshots(self):
+        """ Backfill the missing cells and fix the ones disagreeing with the lines.
+
+        Cells only drift when lines are changed without going through the
+        ORM, e.g. by a data migration, so any fix is logged.
+        """
+        cr = self.env.cr
+        self.env['account.move.line'].flush_model(['partner_id', 'date', 'debit', 'credit', 'balance',
+                                                   'partner_ledger_account_type'])
+        cr.execute("""
+            INSERT INTO tt_partner_ledger_snapshot AS s (partner_id, month, debit, credit, balance, line_count)
+                 SELECT aml.partner_id, date_trunc('month', aml.date)::date,
+                        SUM(aml.debit), SUM(aml.credit), SUM(aml.balance), COUNT(*)
+                   FROM account_move_line aml
+                  WHERE aml.partner_id IS NOT NULL
+                    AND aml.partner_ledger_account_type IN %s
+               GROUP BY aml.partner_id, date_trunc('month', aml.date)
+            ON CONFLICT (partner_id, month) DO UPDATE
+                    SET debit = EXCLUDED.debit, credit = EXCLUDED.credit,
+                        balance = EXCLUDED.balance, line_count = EXCLUDED.line_count
+                  WHERE (s.debit, s.credit, s.balance, s.line_count)
+                        IS DISTINCT FROM (EXCLUDED.debit, EXCLUDED.credit, EXCLUDED.balance, EXCLUDED.line_count)
+        """, [LEDGER_ACCOUNT_TYPES])
+        fixed = cr.rowcount
+        cr.execute("""
+            DELETE FROM tt_partner_ledger_snapshot s
+                  WHERE NOT EXISTS (
+                        SELECT 1 FROM account_move_line aml
+                         WHERE aml.partner_id = s.partner_id
+                           AND aml.date >= s.month
+                           AND aml.date < s.month + interval '1 month'
+                           AND aml.partner_ledger_account_type IN %s
+                  )
+        """, [LEDGER_ACCOUNT_TYPES])
+        fixed += cr.rowcount
+
+        ICP = self.env['ir.config_parameter'].sudo()
+        if not ICP.get_param(SNAPSHOTS_READY_PARAM):
+            _logger.info("Partner ledger snapshots backfilled: %s cells", fixed)
+        elif fixed:
+            _logger.warning("Partner ledger snapshots: %s cells disagreed with the lines and were fixed", fixed)
+        ICP.set_param(SNAPSHOTS_READY_PARAM, fields.Datetime.to_string(fields.Datetime.now()))
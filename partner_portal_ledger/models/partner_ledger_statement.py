@@ -0,0 +1,195 @@
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.modules.registry import Registry
+from odoo.tools import split_every
+
+from .. import exporters
+from .partner_ledger import LEDGER_ACCOUNT_TYPES
+from .partner_ledger_batch import PARTNERS_PER_TRANSACTION
+
+# Formats pre-rendered at month end
+STATEMENT_FORMATS = ('pdf', 'xlsx')
+# Statements saved per commit by the cron
+SAVE_BATCH = 50
+
+
+class TTPartnerLedgerStatement(models.Model):
+    """ Month-end statement of a partner, rendered ahead of time.
+
+    Right after month end every customer downloads last month's statement,
+    so the cron renders them for all the partners with lines in the month,
+    in each format and in the date format of the partner's language. The
+    portal export route serves the stored file instead of rendering it when
+    the requested filters are exactly a past month.
+
+    A statement also depends on every earlier line through its opening
+    balance, so a line created, changed or removed in a month drops the
+    partner's statements of that month and the later ones when its change
+    marker is applied, see ``tt.partner.ledger._apply_pending_changes``;
+    until then they are not served. Last month's are rendered again on the
+    cron's next run, older ones are rendered on demand again.
+    """
+    _name = 'tt.partner.ledger.statement'
+    _description = 'TT Partner Ledger Month-End Statement'
+    _order = 'month desc, partner_id'
+
+    partner_id = fields.Many2one('res.partner', required=True, ondelete='cascade', index=True)
+    month = fields.Date(required=True, help="First day of the month")
+    fmt = fields.Char(string='Format', required=True)
+    date_format = fields.Char(required=True)
+    attachment_id = fields.Many2one('ir.attachment', required=True, ondelete='cascade')
+
+    _sql_constraints = [
+        ('statement_uniq', 'unique(partner_id, month, fmt, date_format)', "One statement per partner, month and format."),
+    ]
+
+    @api.model
+    def _statement_month(self, filters):
+        """ First day of the month selected by ``filters`` if they are those
+        of a statement of a month already over, None otherwise
+        """
+        if filters.search_term or filters.group_by != 'none' or not (filters.date_from and filters.date_to):
+            return None
+        date_from = fields.Date.to_date(filters.date_from)
+        date_to = fields.Date.to_date(filters.date_to)
+        if date_from.day != 1 or date_to != date_from + relativedelta(months=1, days=-1):
+            return None
+        if date_to >= fields.Date.context_today(self):
+            return None
+        return date_from
+
+    @api.model
+    def _find(self, partner, fmt, filters, date_format):
+        """ The stored statement matching an export request, if any """
+        month = self._statement_month(filters)
+        if not month or fmt not in STATEMENT_FORMATS or self._is_stale(partner, month):
+            return self.browse()
+        return self.sudo().search([
+            ('partner_id', '=', partner.id),
+            ('month', '=', month),
+            ('fmt', '=', fmt),
+            ('date_format', '=', date_format),
+        ], limit=1)
+
+    @api.model
+    def _is_stale(self, partner, month):
+        """ Whether a change to the partner's lines of ``month`` or earlier is
+        not applied yet, its statements of ``month`` being about to be dropped
+        """
+        self.env.cr.execute("""
+            SELECT 1 FROM partner_ledger_change
+             WHERE partner_id = %s AND NOT applied AND (month IS NULL OR month <= %s)
+             LIMIT 1
+        """, [partner.id, month])
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _drop_stale(self, stale):
+        """ Drop the statements of each partner of ``stale`` from its month on """
+        partner_ids = list(stale)
+        self.env.cr.execute("""
+            SELECT s.id
+              FROM tt_partner_ledger_statement s
+              JOIN unnest(%s::int[], %s::date[]) AS c(partner_id, month)
+                ON s.partner_id = c.partner_id AND s.month >= c.month
+        """, [partner_ids, [stale[partner_id] for partner_id in partner_ids]])
+        statements = self.sudo().browse([row[0] for row in self.env.cr.fetchall()])
+        statements.attachment_id.unlink()
+
+    @api.model
+    def _active_partners(self, month):
+        """ Partners with ledger lines in ``month`` """
+        if self.env['tt.partner.ledger.snapshot']._is_ready():
+            self.env.cr.execute("SELECT partner_id FROM tt_partner_ledger_snapshot WHERE month = %s", [month])
+        else:
+            self.env['tt.partner.ledger']._flush_ledger()
+            self.env.cr.execute("""
+                SELECT DISTINCT partner_id
+                  FROM account_move_line
+                 WHERE partner_id IS NOT NULL
+                   AND partner_ledger_account_type IN %s
+                   AND date >= %s AND date < %s
+            """, [LEDGER_ACCOUNT_TYPES, month, month + relativedelta(months=1)])
+        return self.env['res.partner'].browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _cron_prerender_statements(self, month=None):
+        """ Render the missing statements of ``month``, by default the last
+        month over, for every partner with lines in it
+        """
+        if month is None:
+            month = fields.Date.context_today(self).replace(day=1) - relativedelta(months=1)
+        date_to = month + relativedelta(months=1, days=-1)
+        filters = self.env['tt.partner.ledger']._normalize_filters(month.isoformat(), date_to.isoformat())
+        partners = self._active_partners(month)
+        date_formats = {lang.code: lang.date_format for lang in self.env['res.lang'].search([])}
+        by_date_format = {}
+        for partner in partners:
+            date_format = date_formats.get(partner.lang or 'en_US', '%Y-%m-%d')
+            by_date_format.setdefault(date_format, []).append(partner.id)
+
+        for fmt in STATEMENT_FORMATS:
+            if not exporters.is_available(fmt):
+                continue
+            for date_format, partner_ids in by_date_format.items():
+                rendered = self.search([
+                    ('partner_id', 'in', partner_ids),
+                    ('month', '=', month),
+                    ('fmt', '=', fmt),
+                    ('date_format', '=', date_format),
+                ]).partner_id
+                todo = self.env['res.partner'].browse(partner_ids) - rendered
+                if todo:
+                    self._render_statements(todo, month, fmt, filters, date_format)
+
+    @api.model
+    def _render_statements(self, partners, month, fmt, filters, date_format):
+        """ Render and save the statements of ``partners``, :data:`SAVE_BATCH` at a time.
+
+        Each batch is committed through a cursor of its own, and the cron's
+        transaction every :data:`PARTNERS_PER_TRANSACTION` partners, so it
+        does not hold back the sync horizon for the whole month. Statements
+        of partners whose ledger changed since the part's transaction started
+        are not saved: they were rendered from lines that are no longer
+        current, and the change has already dropped the older statements.
+        """
+        Batch = self.env['tt.partner.ledger.batch']
+        for part in split_every(PARTNERS_PER_TRANSACTION, partners.sorted('id').ids, partners.browse):
+            generations = self._generations(part)
+            files = []
+            for file in Batch._render_ledgers(part, fmt, filters, date_format):
+                files.append(file)
+                if len(files) == SAVE_BATCH:
+                    self._save_statements(files, month, fmt, date_format, generations)
+                    files = []
+            if files:
+                self._save_statements(files, month, fmt, date_format, generations)
+            self.env.cr.commit()
+
+    def _generations(self, partners):
+        """ Ledger generation of each of ``partners``, see ``tt.partner.ledger._ledger_generation`` """
+        self.env.cr.execute("""
+            SELECT partner_id, MAX(id), COUNT(*) FROM partner_ledger_change WHERE partner_id = ANY(%s) GROUP BY partner_id
+        """, [partners.ids])
+        return {partner_id: (max_id, count) for partner_id, max_id, count in self.env.cr.fetchall()}
+
+    def _save_statements(self, files, month, fmt, date_format, generations):
+        exporter_class = exporters.get_exporter(fmt)
+        with Registry(self.env.cr.dbname).cursor() as cr:
+            Statement = self.with_env(self.env(cr=cr))
+            current = Statement._generations(self.env['res.partner'].browse([partner.id for partner, _title, _data in files]))
+            files = [file for file in files if current.get(file[0].id) == generations.get(file[0].id)]
+            attachments = Statement.env['ir.attachment'].create([{
+                'name': f'{title} {month:%Y-%m}.{fmt}',
+                'raw': data,
+                'mimetype': exporter_class.content_type,
+                'res_model': self._name,
+            } for partner, title, data in files])
+            Statement.create([{
+                'partner_id': partner.id,
+                'month': month,
+                'fmt': fmt,
+                'date_format': date_format,
+                'attachment_id': attachment.id,
+            } for (partner, _title, _data), attachment in zip(files, attachments)])
@@ -0,0 +1,41 @@
+import uuid
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import consteq
+
+# last_used_at is only refreshed this often, not on every poll
+LAST_USED_RESOLUTION = timedelta(hours=1)
+
+
+class TTPartnerLedgerSyncToken(models.Model):
+    """ Bearer token giving an integration read access to one partner's
+    ledger through the ``/ledger/sync`` delta API.
+    """
+    _name = 'tt.partner.ledger.sync.token'
+    _description = 'TT Partner Ledger Sync Token'
+    _order = 'partner_id, id'
+
+    name = fields.Char(required=True, help="Integration using the token, e.g. the customer's ERP")
+    partner_id = fields.Many2one('res.partner', required=True, ondelete='cascade', index=True)
+    access_token = fields.Char(required=True, readonly=True, copy=False, index=True,
+                               default=lambda self: str(uuid.uuid4()))
+    active = fields.Boolean(default=True)
+    last_used_at = fields.Datetime(readonly=True)
+
+    @api.model
+    def _authenticate(self, token):
+        """ The active token record matching ``token``, or an empty recordset """
+        if not token:
+            return self.browse()
+        record = self.sudo().search([('access_token', '=', token)], limit=1)
+        if not record or not consteq(record.access_token, token):
+            return self.browse()
+        now = fields.Datetime.now()
+        if not record.last_used_at or record.last_used_at < now - LAST_USED_RESOLUTION:
+            record.last_used_at = now
+        return record
+
+    def action_regenerate_token(self):
+        for record in self:
+            record.access_token = str(uuid.uuid4())
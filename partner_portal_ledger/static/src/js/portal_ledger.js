@@ -0,0 +1,326 @@
+function showDetails(line_id) {
+    fetch('/my/ledger/detail/' + line_id)
+        .then(response => response.text())
+        .then(html => {
+            document.getElementById('modal-body').innerHTML = html;
+            new bootstrap.Modal(document.getElementById('detailModal')).show();
+        });
+}
+function closeModal() {
+    bootstrap.Modal.getInstance(document.getElementById('detailModal')).hide();
+}
+
+/*
+ * Virtual ledger table
+ *
+ * Rows are fetched from /my/ledger/data in windows of WINDOW_SIZE rows,
+ * following the keyset cursor of the previous window as the user scrolls,
+ * and kept in columnar arrays as sent by the server. Only the rows in view
+ * (plus OVERSCAN rows on each side) exist in the DOM; spacer rows stand in
+ * for the others so the scrollbar reflects the whole ledger.
+ */
+const WINDOW_SIZE = 500;
+const OVERSCAN = 20;
+const ROW_HEIGHT = 44;  // kept in sync with .ledger-viewport rows in portal_ledger.css
+const ROW_COLUMNS = ['id', 'date', 'move_name', 'name', 'debit', 'credit', 'running_balance', 'group_date'];
+
+const ledger = {
+    filters: {},
+    rows: null,         // columnar arrays, see ROW_COLUMNS
+    groups: null,       // columnar group subtotals, sent with the first window
+    groupIndex: {},     // group_date -> index in groups
+    items: [],          // display order: row index, or -(group index) - 1 for a group header
+    lastGroup: null,
+    count: 0,
+    openingBalance: 0,
+    nextCursor: null,
+    loaded: false,
+    loading: false,
+    generation: 0,      // bumped on filter change, so stale windows are dropped
+};
+
+function escapeHtml(value) {
+    return String(value).replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' })[c]);
+}
+function formatAmount(value) {
+    return Number(value).toFixed(2);
+}
+
+function rpc(url, params) {
+    return fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ jsonrpc: '2.0', method: 'call', params: params }),
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                throw data.error;
+            }
+            return data.result;
+        });
+}
+
+function readFilters() {
+    return {
+        date_from: document.getElementById('date_from').value,
+        date_to: document.getElementById('date_to').value,
+        search_term: document.getElementById('search_term').value,
+        group_by: document.getElementById('group_by').value,
+        summary: document.getElementById('summary').checked ? '1' : '',
+    };
+}
+
+function filterQueryString(filters) {
+    const params = new URLSearchParams(filters);
+    for (const [key, value] of [...params]) {
+        if (!value) {
+            params.delete(key);
+        }
+    }
+    return params.toString();
+}
+
+function appendRows(columns) {
+    const rows = ledger.rows;
+    const offset = rows.id.length;
+    for (const column of ROW_COLUMNS) {
+        Array.prototype.push.apply(rows[column], columns[column]);
+    }
+    for (let i = 0; i < columns.id.length; i++) {
+        const groupDate = columns.group_date[i];
+        if (groupDate && groupDate !== ledger.lastGroup) {
+            ledger.items.push(-ledger.groupIndex[groupDate] - 1);
+            ledger.lastGroup = groupDate;
+        }
+        ledger.items.push(offset + i);
+    }
+}
+
+function applyWindow(result, first) {
+    if (first) {
+        ledger.count = result.count;
+        ledger.openingBalance = result.opening_balance;
+        ledger.groups = result.groups;
+        ledger.rows = Object.fromEntries(ROW_COLUMNS.map(column => [column, []]));
+        ledger.groupIndex = {};
+        ledger.groups.group_date.forEach((groupDate, index) => { ledger.groupIndex[groupDate] = index; });
+        if (ledger.filters.summary) {
+            ledger.items = ledger.groups.group_date.map((groupDate, index) => -index - 1);
+        }
+        renderFooter();
+    }
+    appendRows(result.rows);
+    ledger.nextCursor = result.next_cursor;
+    ledger.loaded = !result.next_cursor;
+    ledger.loading = false;
+    render();
+}
+
+function fetchWindow() {
+    const generation = ledger.generation;
+    const first = ledger.rows === null;
+    ledger.loading = true;
+    rpc('/my/ledger/data', Object.assign({}, ledger.filters, {
+        after: first ? null : ledger.nextCursor,
+        limit: WINDOW_SIZE,
+    })).then(result => {
+        if (generation === ledger.generation) {
+            applyWindow(result, first);
+        }
+    }).catch(error => {
+        if (generation === ledger.generation) {
+            ledger.loading = false;
+            console.error('Could not load the ledger:', error);
+        }
+    });
+}
+
+function totalItems() {
+    if (ledger.rows === null) {
+        return 0;
+    }
+    let total = ledger.loaded ? ledger.items.length : ledger.count + ledger.groups.group_date.length;
+    if (ledger.filters.date_from) {
+        total += 1;  // opening balance row
+    }
+    return total;
+}
+
+function renderItem(index) {
+    if (index === ledger.items.length) {
+        return '<tr class="carried-forward"><td colspan="5">Opening Balance</td>' +
+            `<td class="text-end">${formatAmount(ledger.openingBalance)}</td><td></td></tr>`;
+    }
+    const item = ledger.items[index];
+    if (item < 0) {
+        const groups = ledger.groups;
+        const g = -item - 1;
+        return '<tr class="group-header">' +
+            `<th colspan="3">${escapeHtml(groups.label[g])} <span class="group-count">(${groups.count[g]} entries)</span></th>` +
+            `<th class="text-end">${formatAmount(groups.debit[g])}</th>` +
+            `<th class="text-end">${formatAmount(groups.credit[g])}</th>` +
+            `<th class="text-end">${formatAmount(groups.net[g])}</th><th></th></tr>`;
+    }
+    const rows = ledger.rows;
+    return '<tr class="table-row">' +
+        `<td>${escapeHtml(rows.date[item])}</td>` +
+        `<td>${escapeHtml(rows.move_name[item])}</td>` +
+        `<td>${escapeHtml(rows.name[item])}</td>` +
+        `<td class="text-end">${formatAmount(rows.debit[item])}</td>` +
+        `<td class="text-end">${formatAmount(rows.credit[item])}</td>` +
+        `<td class="text-end">${formatAmount(rows.running_balance[item])}</td>` +
+        '<td class="text-center"><button class="btn btn-sm btn-outline-primary view-btn" ' +
+        `onclick="showDetails('${rows.id[item]}')">👁</button></td></tr>`;
+}
+
+function spacer(height) {
+    return height > 0 ? `<tr class="ledger-spacer"><td colspan="7" style="height: ${height}px"></td></tr>` : '';
+}
+
+function render() {
+    const viewport = document.getElementById('ledger-viewport');
+    const total = totalItems();
+    const start = Math.max(0, Math.floor(viewport.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const end = Math.min(total, Math.ceil((viewport.scrollTop + viewport.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    // the opening balance row comes right after the last item, once everything is loaded
+    const available = ledger.items.length + (ledger.loaded && ledger.filters.date_from ? 1 : 0);
+    const last = Math.min(end, available);
+
+    let html = spacer(start * ROW_HEIGHT);
+    for (let index = start; index < last; index++) {
+        html += renderItem(index);
+    }
+    html += spacer((total - Math.max(last, start)) * ROW_HEIGHT);
+    document.getElementById('ledger-virtual-body').innerHTML = html;
+
+    if (end > ledger.items.length && ledger.nextCursor && !ledger.loading) {
+        fetchWindow();
+    }
+}
+
+function renderFooter() {
+    document.getElementById('ledger-virtual-count').textContent = `${ledger.count} Entries`;
+    document.getElementById('ledger-virtual-opening').textContent =
+        ledger.filters.date_from ? `Opening Balance: ${formatAmount(ledger.openingBalance)}` : '';
+}
+
+// firstWindow: the first window of the current filters, when already known
+function reloadLedger(firstWindow) {
+    ledger.filters = readFilters();
+    ledger.generation += 1;
+    ledger.rows = null;
+    ledger.groups = null;
+    ledger.items = [];
+    ledger.lastGroup = null;
+    ledger.nextCursor = null;
+    ledger.loaded = false;
+    ledger.loading = false;
+
+    const queryString = filterQueryString(ledger.filters);
+    document.querySelectorAll('.ledger-export').forEach(link => {
+        link.href = `/my/ledger/export/${link.dataset.format}?${queryString}`;
+    });
+    history.replaceState(null, '', `/my/ledger?${queryString}`);
+
+    document.getElementById('ledger-viewport').scrollTop = 0;
+    document.getElementById('ledger-virtual-body').innerHTML = '';
+    if (firstWindow) {
+        applyWindow(firstWindow, true);
+    } else {
+        fetchWindow();
+    }
+}
+
+/*
+ * Background exports
+ *
+ * Formats rendered by an export job (links with data-job) are queued with a
+ * POST to their export URL; the job status is then polled until the file
+ * can be downloaded. Files rendered ahead of time are downloaded at once.
+ */
+const JOB_POLL_INTERVAL = 1000;
+
+function showExportStatus(text) {
+    document.getElementById('ledger-export-status').textContent = text;
+}
+
+function startExportJob(link) {
+    const url = new URL(link.href, window.location.origin);
+    const body = new FormData();
+    url.searchParams.forEach((value, key) => body.append(key, value));
+    body.append('mode', 'job');
+    showExportStatus(`Preparing ${link.dataset.format.toUpperCase()} export...`);
+    // the page is cached, so it carries no CSRF token of its own
+    rpc('/my/ledger/csrf_token', {})
+        .then(csrfToken => {
+            body.append('csrf_token', csrfToken);
+            return fetch(url.pathname, { method: 'POST', body: body });
+        })
+        .then(response => response.json())
+        .then(job => {
+            if (job.download_url) {
+                // already rendered, e.g. a month-end statement
+                showExportStatus('');
+                window.location = job.download_url;
+            } else {
+                pollExportJob(job.status_url, link.dataset.format.toUpperCase());
+            }
+        })
+        .catch(() => showExportStatus('The export could not be started.'));
+}
+
+function pollExportJob(statusUrl, label) {
+    fetch(statusUrl)
+        .then(response => response.json())
+        .then(status => {
+            if (status.state === 'done') {
+                showExportStatus(`${label} export ready.`);
+                window.location = status.download_url;
+            } else if (status.state === 'failed') {
+                showExportStatus(`${label} export failed: ${status.error}`);
+            } else {
+                showExportStatus(`Preparing ${label} export... ${status.progress}%`);
+                setTimeout(() => pollExportJob(statusUrl, label), JOB_POLL_INTERVAL);
+            }
+        })
+        .catch(() => showExportStatus('The export status could not be retrieved.'));
+}
+
+document.querySelectorAll('.ledger-export[data-job]').forEach(link => {
+    link.addEventListener('click', event => {
+        event.preventDefault();
+        startExportJob(link);
+    });
+});
+
+const filterForm = document.getElementById('ledger-filter-form');
+let timeout;
+filterForm.addEventListener('submit', event => {
+    event.preventDefault();
+    reloadLedger();
+});
+filterForm.querySelectorAll('input, select').forEach(element => {
+    element.addEventListener(element.type === 'text' ? 'input' : 'change', () => {
+        clearTimeout(timeout);
+        timeout = setTimeout(reloadLedger, 300);
+    });
+});
+
+let scheduled = false;
+document.getElementById('ledger-viewport').addEventListener('scroll', () => {
+    if (!scheduled) {
+        scheduled = true;
+        requestAnimationFrame(() => {
+            scheduled = false;
+            render();
+        });
+    }
+});
+
+// the page carries the first window of its filters, unless it was opened
+// on an older or newer page
+const virtualTable = document.getElementById('ledger-virtual');
+document.getElementById('ledger-static').classList.add('d-none');
+virtualTable.classList.remove('d-none');
+reloadLedger(virtualTable.dataset.firstWindow ? JSON.parse(virtualTable.dataset.firstWindow) : null);
@@ -0,0 +1,11 @@
+from . import test_ledger_batches
+from . import test_ledger_benchmark
+from . import test_ledger_cache
+from . import test_ledger_export_jobs
+from . import test_ledger_exporters
+from . import test_ledger_plans
+from . import test_ledger_queries
+from . import test_ledger_routes
+from . import test_ledger_snapshots
+from . import test_ledger_statements
+from . import test_ledger_sync
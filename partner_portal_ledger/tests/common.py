@@ -0,0 +1,84 @@
+""" Synthetic ledger data for the benchmarks.
+
+Lines are cloned in bulk with INSERT ... SELECT from a real posted invoice,
+so every column the ORM would fill gets a valid value while a million lines
+still take seconds to generate instead of hours.
+"""
+from datetime import date, timedelta
+
+
+def _columns(cr, table):
+    cr.execute("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_name = %s AND column_name != 'id'
+    """, [table])
+    return [row[0] for row in cr.fetchall()]
+
+
+def _clone_select(columns, overrides):
+    """ Column list and select list copying ``t`` but for the ``overrides`` SQL expressions """
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    select_list = ', '.join(overrides.get(column, f't."{column}"') for column in columns)
+    return column_list, select_list
+
+
+def generate_ledger(env, partner, template_line, line_count, start=date(2015, 1, 1), days=3650, prefix='BENCH'):
+    """ Give ``partner`` ``line_count`` more ledger lines spread over ``days`` days from ``start``.
+
+    Each line gets an entry of its own, cloned from the entry of
+    ``template_line`` (a posted receivable or payable line); amounts
+    alternate between debits and credits, one description in ten being
+    long enough to wrap in the PDF.
+    """
+    cr = env.cr
+    env.flush_all()
+    move_columns, move_select = _clone_select(_columns(cr, 'account_move'), {
+        'name': f"'{prefix}/' || %(partner)s || '/' || lpad(n::text, 7, '0')",
+        'ref': "'BENCH' || n",
+        'partner_id': '%(partner)s',
+        'commercial_partner_id': '%(partner)s',
+        'date': "%(start)s::date + (n * %(days)s / %(count)s)",
+        'invoice_date': "%(start)s::date + (n * %(days)s / %(count)s)",
+    })
+    cr.execute(f"""
+        INSERT INTO account_move ({move_columns})
+             SELECT {move_select}
+               FROM account_move t, generate_series(1, %(count)s) AS n
+              WHERE t.id = %(template_move)s
+    """, {
+        'partner': partner.id, 'start': start, 'days': days, 'count': line_count,
+        'template_move': template_line.move_id.id,
+    })
+
+    line_columns, line_select = _clone_select(_columns(cr, 'account_move_line'), {
+        'move_id': 'm.id',
+        'move_name': 'm.name',
+        'partner_id': '%(partner)s',
+        'date': 'm.date',
+        'name': """CASE WHEN m.id %% 10 = 0
+                        THEN 'Long description of synthetic ledger line ' || m.name || ' wrapping over several lines'
+                        ELSE 'Line ' || m.name END""",
+        'debit': 'CASE WHEN m.id %% 3 = 0 THEN 0.0 ELSE (m.id %% 1000) + 0.5 END',
+        'credit': 'CASE WHEN m.id %% 3 = 0 THEN (m.id %% 700) + 0.25 ELSE 0.0 END',
+        'balance': 'CASE WHEN m.id %% 3 = 0 THEN -((m.id %% 700) + 0.25) ELSE (m.id %% 1000) + 0.5 END',
+        'amount_currency': 'CASE WHEN m.id %% 3 = 0 THEN -((m.id %% 700) + 0.25) ELSE (m.id %% 1000) + 0.5 END',
+        'amount_residual': '0.0',
+        'amount_residual_currency': '0.0',
+        'reconciled': 'false',
+        'full_reconcile_id': 'NULL',
+    })
+    cr.execute(f"""
+        INSERT INTO account_move_line ({line_columns})
+             SELECT {line_select}
+               FROM account_move_line t, account_move m
+              WHERE t.id = %(template_line)s
+                AND m.name LIKE %(pattern)s
+    """, {'partner': partner.id, 'template_line': template_line.id, 'pattern': f'{prefix}/{partner.id}/%'})
+    cr.execute("ANALYZE account_move")
+    cr.execute("ANALYZE account_move_line")
+    env.invalidate_all()
+
+
+def date_range_filters(days=365, end=date(2015, 1, 1) + timedelta(days=3650)):
+    """ Filters selecting the last ``days`` days of the generated history """
+    return {'date_from': (end - timedelta(days=days)).isoformat(), 'date_to': end.isoformat()}
@@ -0,0 +1,101 @@
+""" ZIP ledger batches: split into parts by size, resumed after the last saved part.
+
+The registry is put in test mode so the batch runs in a test cursor, whose
+commits between parts only release a savepoint.
+"""
+import csv
+import io
+import zipfile
+
+from odoo.tests import TransactionCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.partner_portal_ledger.models.partner_ledger import LEDGER_ACCOUNT_TYPES
+from odoo.addons.partner_portal_ledger.models.partner_ledger_batch import BATCH_WORKERS_PARAM, ZIP_PART_SIZE_PARAM
+
+HEADER = ['Date', 'Move', 'Description', 'Debit', 'Credit', 'Balance']
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerBatches(AccountTestInvoicingCommon, TransactionCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.partners = cls.env['res.partner'].create([{'name': f'Batch Partner {index}'} for index in range(3)])
+        cls.invoices = {
+            partner.id: cls.init_invoice('out_invoice', partner=partner, amounts=[100.0 * index], post=True)
+            for index, partner in enumerate(cls.partners, start=1)
+        }
+        ICP = cls.env['ir.config_parameter'].sudo()
+        # render in the test process; every partner overflows a 1-byte part
+        ICP.set_param(BATCH_WORKERS_PARAM, '1')
+        ICP.set_param(ZIP_PART_SIZE_PARAM, '1')
+
+    def setUp(self):
+        super().setUp()
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+
+    def _batch(self, **vals):
+        return self.env['tt.partner.ledger.batch'].create(dict({
+            'partner_ids': [(6, 0, self.partners.ids)],
+            'fmt': 'csv',
+            'output': 'zip',
+        }, **vals))
+
+    def _run(self, batch):
+        """ Run ``batch`` as the cron would once it is claimed """
+        batch.write(batch._start_values())
+        with self.registry.cursor() as cr:
+            batch.with_env(batch.env(cr=cr))._run()
+        batch.invalidate_recordset()
+
+    def _parts(self, batch):
+        """ CSV rows of the members of each archive part, by member name, in part order """
+        parts = []
+        for attachment in batch.attachment_ids.sorted('name'):
+            with zipfile.ZipFile(io.BytesIO(attachment.raw)) as archive:
+                parts.append({
+                    name: list(csv.reader(io.StringIO(archive.read(name).decode('utf-8'))))
+                    for name in archive.namelist()
+                })
+        return parts
+
+    def _assertLedger(self, rows, partner):
+        line = self.invoices[partner.id].line_ids.filtered(
+            lambda line: line.account_id.account_type in LEDGER_ACCOUNT_TYPES)
+        self.assertEqual(rows, [HEADER, [
+            line.date.strftime('%Y-%m-%d'),
+            line.move_id.name,
+            line.name or '',
+            f'{line.debit:.2f}',
+            f'{line.credit:.2f}',
+            f'{line.balance:.2f}',
+        ]])
+
+    def _assertParts(self, parts, partners):
+        self.assertEqual(len(parts), len(partners))
+        for part, partner in zip(parts, partners):
+            [(name, rows)] = part.items()
+            self.assertTrue(name.startswith(f'{partner.id} '))
+            self._assertLedger(rows, partner)
+
+    def test_zip_split(self):
+        batch = self._batch()
+        self._run(batch)
+        self.assertEqual(batch.state, 'done', batch.error)
+        self.assertEqual(batch.partners_done, 3)
+        self.assertEqual(batch.last_partner_id, self.partners.sorted('id')[-1].id)
+        self._assertParts(self._parts(batch), self.partners.sorted('id'))
+
+    def test_zip_resume(self):
+        partners = self.partners.sorted('id')
+        # a first run saved the part of the first partner, then failed
+        batch = self._batch(state='failed', last_partner_id=partners[0].id, error="Worker killed")
+        batch.action_retry()
+        self.assertEqual(batch.state, 'pending')
+        self._run(batch)
+        self.assertEqual(batch.state, 'done', batch.error)
+        self.assertEqual(batch.partners_done, 3)
+        self.assertEqual(batch.last_partner_id, partners[-1].id)
+        self._assertParts(self._parts(batch), partners[1:])
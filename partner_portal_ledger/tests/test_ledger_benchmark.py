@@ -0,0 +1,229 @@
+""" Benchmarks of the portal ledger routes.
+
+Not part of the regular test runs; run them against a local database with::
+
+    odoo-bin -d bench -i partner_portal_ledger --test-tags partner_ledger_benchmark --stop-after-init
+
+Environment variables:
+
+* ``PARTNER_LEDGER_BENCH_SIZES``: comma-separated line counts, one partner
+  each (default ``1000,10000``; up to 1M is supported)
+* ``PARTNER_LEDGER_BENCH_REPORT``: path of the JSON report (default
+  ``partner_ledger_benchmark.json`` in the working directory)
+* ``PARTNER_LEDGER_BENCH_BASELINE``: path of the report of an earlier
+  run; the ratio of every measure to the baseline's is logged per case
+
+Every route is timed for each combination of filters and grouping, once
+for the wall time, time to first byte and SQL query count, then once more
+under tracemalloc for the peak Python memory. The cases reading the whole
+ledger also get the wall time per line. Routes answering with an ETag are
+then fetched again as a returning client would, with ``If-None-Match``,
+and that revalidation is timed as well. The report is keyed by case name
+so reports of two commits can be diffed or compared case by case.
+
+The harness only relies on the routes, so it can be copied into an older
+revision of the module to measure it, e.g. the 10k and 100k lines
+comparison with HEAD::
+
+    git worktree add /tmp/ledger-base <revision>
+    mkdir /tmp/ledger-base/partner_portal_ledger/tests
+    cp partner_portal_ledger/tests/{common,test_ledger_benchmark}.py /tmp/ledger-base/partner_portal_ledger/tests/
+    echo 'from . import test_ledger_benchmark' > /tmp/ledger-base/partner_portal_ledger/tests/__init__.py
+    PARTNER_LEDGER_BENCH_SIZES=10000,100000 PARTNER_LEDGER_BENCH_REPORT=base.json \
+        odoo-bin --addons-path=/tmp/ledger-base,... -d bench_base -i partner_portal_ledger \
+        --test-tags partner_ledger_benchmark --stop-after-init
+    PARTNER_LEDGER_BENCH_SIZES=10000,100000 PARTNER_LEDGER_BENCH_BASELINE=base.json \
+        odoo-bin -d bench_head -i partner_portal_ledger --test-tags partner_ledger_benchmark --stop-after-init
+"""
+import json
+import logging
+import os
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import urlencode
+
+import odoo
+from odoo.tests import HttpCase, tagged
+from odoo.tests.common import HOST
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+from .common import date_range_filters, generate_ledger
+
+try:
+    from odoo.addons.partner_portal_ledger import exporters
+    from odoo.addons.partner_portal_ledger.ledger_cache import LEDGER_CACHE
+except ImportError:
+    # older revisions of the module: no pluggable exporters nor ledger cache
+    exporters = LEDGER_CACHE = None
+
+_logger = logging.getLogger(__name__)
+
+GROUP_BYS = ('none', 'day', 'month', 'year')
+FORMATS = ('csv', 'xlsx', 'pdf', 'parquet')
+# Measures compared with the baseline report, lower is better
+COMPARED = ('wall_time', 'ttfb', 'per_line', 'queries', 'peak_memory', 'revalidate_time')
+
+
+def _formats():
+    if exporters is None:
+        return FORMATS[:3]
+    return [fmt for fmt in FORMATS if exporters.is_available(fmt)]
+
+
+def _clear_cache():
+    if LEDGER_CACHE is not None:
+        LEDGER_CACHE.clear()
+
+
+def _filter_sets():
+    return {
+        'all': {},
+        'last_year': date_range_filters(),
+        'search': {'search_term': 'Long description'},
+        # a single line, by its move name and label
+        'search_rare': {'search_term': '0000123'},
+    }
+
+
+@tagged('post_install', '-at_install', '-standard', 'partner_ledger_benchmark')
+class TestLedgerBenchmark(AccountTestInvoicingCommon, HttpCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.sizes = [int(size) for size in os.environ.get('PARTNER_LEDGER_BENCH_SIZES', '1000,10000').split(',')]
+        cls.report_path = os.environ.get('PARTNER_LEDGER_BENCH_REPORT', 'partner_ledger_benchmark.json')
+        cls.template_invoice = cls.init_invoice('out_invoice', partner=cls.partner_a, amounts=[100.0], post=True)
+        cls.template_line = cls.template_invoice.line_ids.filtered(
+            lambda line: line.account_id.account_type == 'asset_receivable')
+
+    def _portal_user(self, line_count):
+        partner = self.env['res.partner'].create({'name': f'Benchmark Partner {line_count}'})
+        generate_ledger(self.env, partner, self.template_line, line_count)
+        user = self.env['res.users'].create({
+            'name': partner.name,
+            'login': f'bench_{line_count}',
+            'password': f'bench_{line_count}',
+            'partner_id': partner.id,
+            'groups_id': [(6, 0, [self.env.ref('base.group_portal').id])],
+        })
+        return user
+
+    def _get(self, url, headers=None):
+        """ Fetch ``url``, reading the body as it is streamed.
+
+        Return the response, its body size, and the times to its first byte
+        and to its end.
+        """
+        start = time.perf_counter()
+        response = self.opener.get(f'http://{HOST}:{odoo.tools.config["http_port"]}{url}',
+                                   headers=headers, timeout=3600, stream=True)
+        ttfb = None
+        size = 0
+        for chunk in response.iter_content(chunk_size=65536):
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            size += len(chunk)
+        wall_time = time.perf_counter() - start
+        return response, size, ttfb if ttfb is not None else wall_time, wall_time
+
+    def _measure(self, url, line_count=None):
+        """ Fetch ``url`` twice: timed with the query count, then under
+        tracemalloc; then revalidate it if it came with an ETag.
+
+        The ledger cache is emptied before the first two fetches, so both
+        measure a cold request. ``line_count`` is the number of lines the
+        route reads, if known, to get the time per line.
+        """
+        _clear_cache()
+        queries_before = odoo.sql_db.sql_counter
+        response, size, ttfb, wall_time = self._get(url)
+        query_count = odoo.sql_db.sql_counter - queries_before
+        self.assertEqual(response.status_code, 200, url)
+
+        _clear_cache()
+        tracemalloc.start()
+        try:
+            self._get(url)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result = {
+            'wall_time': round(wall_time, 4),
+            'ttfb': round(ttfb, 4),
+            'queries': query_count,
+            'peak_memory': peak,
+            'bytes': size,
+        }
+        if line_count:
+            result['per_line'] = round(wall_time / line_count * 1e6, 3)
+
+        etag = response.headers.get('ETag')
+        if etag:
+            revalidated, _size, _ttfb, revalidate_time = self._get(url, headers={'If-None-Match': etag})
+            self.assertEqual(revalidated.status_code, 304, url)
+            result['revalidate_time'] = round(revalidate_time, 4)
+        return result
+
+    def _git_revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__),
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, results):
+        """ Log the ratio of each measure to the one of the baseline report, if any """
+        path = os.environ.get('PARTNER_LEDGER_BENCH_BASELINE')
+        if not path:
+            return
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        _logger.info("Ledger benchmark compared with %s (revision %s)", path, baseline.get('revision'))
+        for case, result in sorted(results.items()):
+            before = baseline['results'].get(case)
+            if not before:
+                continue
+            ratios = {
+                measure: round(result[measure] / before[measure], 3)
+                for measure in COMPARED
+                if result.get(measure) is not None and before.get(measure)
+            }
+            _logger.info("Ledger benchmark %s: %s of baseline", case, ratios)
+
+    def test_ledger_benchmark(self):
+        results = {}
+        for line_count in self.sizes:
+            user = self._portal_user(line_count)
+            self.authenticate(user.login, user.login)
+            line = self.env['account.move.line'].search([('partner_id', '=', user.partner_id.id)], limit=1)
+            results[f'{line_count}/ledger_detail'] = self._measure(f'/my/ledger/detail/{line.id}')
+            for filter_name, filters in _filter_sets().items():
+                # only the exports of the whole ledger are known to read every line
+                lines_read = line_count if filter_name == 'all' else None
+                for group_by in GROUP_BYS:
+                    params = dict(filters, group_by=group_by)
+                    case = f'{line_count}/{filter_name}/{group_by}'
+                    results[f'{case}/show_ledger'] = self._measure(f'/my/ledger?{urlencode(params)}')
+                    if group_by != 'none':
+                        summary = dict(params, summary='1')
+                        results[f'{case}/show_ledger_summary'] = self._measure(f'/my/ledger?{urlencode(summary)}')
+                    for fmt in _formats():
+                        results[f'{case}/export_{fmt}'] = self._measure(
+                            f'/my/ledger/export/{fmt}?{urlencode(params)}', lines_read)
+                    _logger.info("Ledger benchmark %s: %s", case, results[f'{case}/show_ledger'])
+
+        self._compare(results)
+        report = {
+            'revision': self._git_revision(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'sizes': self.sizes,
+            'results': results,
+        }
+        with open(self.report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+        _logger.info("Ledger benchmark report written to %s", os.path.abspath(self.report_path))
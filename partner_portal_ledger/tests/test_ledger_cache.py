@@ -0,0 +1,114 @@
+""" Invalidation of the ledger cache through the change log.
+
+The registry is put in test mode, so the cursors opened after the commit
+and by the crons share the test transaction; committing is emulated by
+running the cursor's precommit and postcommit callbacks.
+"""
+from datetime import datetime, timedelta
+
+from odoo.tests import TransactionCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.partner_portal_ledger.instrumentation import RouteTimer
+from odoo.addons.partner_portal_ledger.ledger_cache import LEDGER_CACHE
+from odoo.addons.partner_portal_ledger.models.partner_ledger import CHANGE_APPLY_DELAY, CHANGE_RETENTION
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerCache(AccountTestInvoicingCommon, TransactionCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.partner = cls.env['res.partner'].create({'name': 'Ledger Cache Partner'})
+        cls.invoice = cls.init_invoice('out_invoice', partner=cls.partner, amounts=[100.0], post=True)
+        cls.Ledger = cls.env['tt.partner.ledger']
+
+    def setUp(self):
+        super().setUp()
+        LEDGER_CACHE.clear()
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        self._commit()
+        self.filters = self.Ledger._normalize_filters()
+        self.line = self.invoice.line_ids.filtered(lambda line: line.account_id.account_type == 'asset_receivable')
+
+    def _commit(self):
+        """ Run what a commit runs; what follows acts as a new transaction """
+        self.env.flush_all()
+        self.cr.precommit.run()
+        self.cr.postcommit.run()
+        self.env.invalidate_all()
+
+    def _generation(self):
+        self.cr.execute("SELECT MAX(id), COUNT(*) FROM partner_ledger_change WHERE partner_id = %s", [self.partner.id])
+        return self.cr.fetchone()
+
+    def _pending(self):
+        return self.Ledger._pending_partner_ids([self.partner.id])
+
+    def test_cached_read_stale_after_change(self):
+        count = self.Ledger._count(self.partner, self.filters)
+        hits = LEDGER_CACHE.hits
+        self.assertEqual(self.Ledger._count(self.partner, self.filters), count)
+        self.assertEqual(LEDGER_CACHE.hits, hits + 1)
+        generation = self.Ledger._ledger_generation(self.partner)
+
+        # the transaction changing the ledger reads around the cache
+        self.init_invoice('out_invoice', partner=self.partner, amounts=[50.0], post=True)
+        self.assertIsNone(self.Ledger._ledger_generation(self.partner))
+        self.assertEqual(self.Ledger._count(self.partner, self.filters), count + 1)
+
+        # the next transactions see a new generation, missing the stale entry
+        self._commit()
+        self.assertNotEqual(self.Ledger._ledger_generation(self.partner), generation)
+        misses = LEDGER_CACHE.misses
+        self.assertEqual(self.Ledger._count(self.partner, self.filters), count + 1)
+        self.assertEqual(LEDGER_CACHE.misses, misses + 1)
+
+    def test_markers_applied_after_commit(self):
+        generation = self._generation()
+        self.line.name = 'Renamed line'
+        self.env.flush_all()
+        self.cr.precommit.run()
+        self.assertNotEqual(self._generation(), generation)
+        self.assertEqual(self._pending(), {self.partner.id})
+        self.cr.postcommit.run()
+        self.assertEqual(self._pending(), set())
+
+    def test_cron_applies_pending_markers(self):
+        self.line.name = 'Renamed line'
+        self.env.flush_all()
+        self.cr.precommit.run()
+        # the worker died before its postcommit callbacks ran
+        self.cr.postcommit.clear()
+        self.cr.execute("UPDATE partner_ledger_change SET changed_at = changed_at - %s WHERE NOT applied",
+                        [CHANGE_APPLY_DELAY * 2])
+        self.assertEqual(self._pending(), {self.partner.id})
+        with self.assertLogs('odoo.addons.partner_portal_ledger.models.partner_ledger', 'WARNING'):
+            self.Ledger._cron_apply_ledger_changes()
+        self.assertEqual(self._pending(), set())
+
+    def test_gc_compacts_applied_markers(self):
+        old = datetime.utcnow() - CHANGE_RETENTION - timedelta(hours=1)
+        self.cr.execute("""
+            INSERT INTO partner_ledger_change (partner_id, changed_at, applied)
+                 VALUES (%(partner)s, %(old)s, true), (%(partner)s, %(old)s, true), (%(partner)s, %(old)s, false)
+        """, {'partner': self.partner.id, 'old': old})
+        generation = self._generation()
+        self.Ledger._gc_ledger_changes()
+        self.assertNotEqual(self._generation(), generation)
+        self.cr.execute("""
+            SELECT applied, COUNT(*) FROM partner_ledger_change
+             WHERE partner_id = %s AND changed_at = %s GROUP BY applied
+        """, [self.partner.id, old])
+        # the old applied markers are replaced by one, the pending one is kept
+        self.assertEqual(dict(self.cr.fetchall()), {True: 1, False: 1})
+        self.assertEqual(self._pending(), {self.partner.id})
+
+    def test_route_timer_counts_cache_lookups(self):
+        timer = RouteTimer('/my/ledger', self.cr.dbname)
+        with timer.active():
+            self.Ledger._count(self.partner, self.filters)
+            self.Ledger._count(self.partner, self.filters)
+        metrics = timer.metrics()
+        self.assertEqual((metrics['cache_hits'], metrics['cache_misses']), (1, 1))
@@ -0,0 +1,80 @@
+""" Background export jobs: identical requests share a job, which runs to a download """
+import json
+
+from odoo.tests import HttpCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerExportJobs(AccountTestInvoicingCommon, HttpCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.invoice = cls.init_invoice('out_invoice', partner=cls.partner_a, amounts=[100.0], post=True)
+        cls.portal_user = cls.env['res.users'].create({
+            'name': cls.partner_a.name,
+            'login': 'ledger_jobs',
+            'password': 'ledger_jobs',
+            'partner_id': cls.partner_a.id,
+            'groups_id': [(6, 0, [cls.env.ref('base.group_portal').id])],
+        })
+        cls.Job = cls.env['tt.partner.ledger.export.job']
+        cls.Ledger = cls.env['tt.partner.ledger']
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate('ledger_jobs', 'ledger_jobs')
+
+    def _enqueue(self, filters=None, fmt='csv'):
+        filters = filters or self.Ledger._normalize_filters()
+        return self.Job.browse(self.Job._enqueue(self.partner_a, self.portal_user, fmt, filters, '%Y-%m-%d'))
+
+    def _post_export(self, fmt='csv'):
+        """ Queue an export the way the portal script does, returning the JSON answer """
+        response = self.url_open('/my/ledger/csrf_token', data=json.dumps({'jsonrpc': '2.0', 'params': {}}),
+                                 headers={'Content-Type': 'application/json'})
+        csrf_token = response.json()['result']
+        response = self.url_open(f'/my/ledger/export/{fmt}?mode=job', data={'csrf_token': csrf_token})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _run(self, job):
+        """ Run ``job`` as the cron would once it is claimed """
+        job.write(job._start_values())
+        job._run()
+        job.invalidate_recordset()
+
+    def test_identical_requests_shared(self):
+        job = self._enqueue()
+        self.assertEqual(job.state, 'pending')
+        self.assertEqual(self._enqueue(), job)
+        self.assertNotEqual(self._enqueue(self.Ledger._normalize_filters('2020-01-01')), job)
+        self.assertNotEqual(self._enqueue(self.Ledger._normalize_filters(search_term='INV')), job)
+        # a finished job is not reused, the ledger may have changed since
+        self._run(job)
+        self.assertNotEqual(self._enqueue(), job)
+
+    def test_identical_posts_shared(self):
+        job_id = self._post_export()['job_id']
+        self.assertEqual(self._post_export()['job_id'], job_id)
+        self.assertEqual(self.Job.search_count([('user_id', '=', self.portal_user.id)]), 1)
+
+    def test_job_runs_to_download(self):
+        answer = self._post_export()
+        job = self.Job.browse(answer['job_id'])
+        self.assertEqual(self.url_open(answer['status_url']).json()['state'], 'pending')
+
+        self._run(job)
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.rows_done, job.row_count)
+        attachment = job.attachment_id
+        self.assertIn(self.invoice.name, attachment.raw.decode())
+        if attachment.store_fname:
+            self.assertEqual(attachment.file_size, len(attachment.raw))
+
+        status = self.url_open(answer['status_url']).json()
+        self.assertEqual((status['state'], status['progress']), ('done', 100))
+        response = self.url_open(status['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, attachment.raw)
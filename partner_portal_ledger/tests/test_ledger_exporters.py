@@ -0,0 +1,66 @@
+""" Files written by the exporters, read back with their libraries """
+import io
+from datetime import date, datetime
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+from odoo.addons.partner_portal_ledger import exporters
+from odoo.addons.partner_portal_ledger.models.partner_ledger import LedgerFilters, LedgerGroup, LedgerRow
+
+FEBRUARY, JANUARY = date(2020, 2, 1), date(2020, 1, 1)
+# newest first, grouped by month, on an opening balance of 20
+ROWS = [
+    LedgerRow(5, date(2020, 2, 3), 'INV/5', 'Line 5', 50.0, 0.0, 50.0, 150.0, FEBRUARY),
+    LedgerRow(4, date(2020, 2, 2), 'INV/4', 'Line 4', 40.0, 0.0, 40.0, 100.0, FEBRUARY),
+    LedgerRow(3, date(2020, 1, 3), 'INV/3', 'Line 3', 30.0, 0.0, 30.0, 60.0, JANUARY),
+    LedgerRow(2, date(2020, 1, 2), 'INV/2', 'Line 2', 20.0, 0.0, 20.0, 30.0, JANUARY),
+    LedgerRow(1, date(2020, 1, 1), 'RINV/1', 'Line 1', 0.0, 10.0, -10.0, 10.0, JANUARY),
+]
+GROUPS = {
+    FEBRUARY: LedgerGroup(FEBRUARY, 90.0, 0.0, 90.0, 2),
+    JANUARY: LedgerGroup(JANUARY, 50.0, 10.0, 40.0, 3),
+}
+OPENING_BALANCE = 20.0
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerExporters(TransactionCase):
+
+    def _exporter(self, fmt):
+        if not exporters.is_available(fmt):
+            self.skipTest(f"the {fmt} exporter is not available")
+        return exporters.get_exporter(fmt)(
+            rows=iter(ROWS),
+            groups=GROUPS,
+            opening_balance=OPENING_BALANCE,
+            filters=LedgerFilters('2020-01-01', '2020-02-29', '', 'month'),
+            date_format='%Y-%m-%d',
+            title='Customer Ledger - Test',
+        )
+
+    def test_xlsx_sheets_split(self):
+        exporter = self._exporter('xlsx')
+        import openpyxl
+        from odoo.addons.partner_portal_ledger.exporters import xlsx_exporter
+
+        output = io.BytesIO()
+        with patch.object(xlsx_exporter, 'XLSX_MAX_ROWS', 4):
+            exporter.write(output)
+        workbook = openpyxl.load_workbook(io.BytesIO(output.getvalue()))
+        rows = []
+        for sheet in workbook.worksheets:
+            sheet_rows = list(sheet.iter_rows(values_only=True))
+            self.assertLessEqual(len(sheet_rows), 4)
+            self.assertEqual(sheet_rows[0], ('Date', 'Move', 'Description', 'Debit', 'Credit', 'Balance'))
+            rows += sheet_rows[1:]
+        self.assertEqual(len(workbook.worksheets), 3)
+        self.assertEqual(rows, [
+            ('Group: 2020-02', None, '2 entries', 90, 0, 90),
+            (datetime(2020, 2, 3), 'INV/5', 'Line 5', 50, 0, 150),
+            (datetime(2020, 2, 2), 'INV/4', 'Line 4', 40, 0, 100),
+            ('Group: 2020-01', None, '3 entries', 50, 10, 40),
+            (datetime(2020, 1, 3), 'INV/3', 'Line 3', 30, 0, 60),
+            (datetime(2020, 1, 2), 'INV/2', 'Line 2', 20, 0, 30),
+            (datetime(2020, 1, 1), 'RINV/1', 'Line 1', 0, 10, 10),
+            ('Opening Balance', None, None, None, None, 20),
+        ])
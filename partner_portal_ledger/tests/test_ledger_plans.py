@@ -0,0 +1,112 @@
+""" Query plans of the ledger queries, with and without the ledger index.
+
+Not part of the regular test runs, as the plans are only meaningful on a
+ledger large enough for the planner to prefer an index; run them with::
+
+    odoo-bin -d bench -i partner_portal_ledger --test-tags partner_ledger_plans --stop-after-init
+
+The plans of the page, count and balance queries are logged without the
+``partner_ledger_aml_partner_date_idx`` index (dropped in a savepoint) and
+with it, and the queries are checked to use it. The plans of a selective
+search are checked to use the trigram indexes of the line label and the
+move name, and its latency is logged.
+"""
+import logging
+import time
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.partner_portal_ledger.ledger_cache import LEDGER_CACHE
+
+from .common import date_range_filters, generate_ledger
+
+_logger = logging.getLogger(__name__)
+
+LEDGER_INDEX = 'partner_ledger_aml_partner_date_idx'
+TRIGRAM_INDEXES = ('partner_ledger_aml_name_trgm_idx', 'partner_ledger_am_name_trgm_idx')
+LINE_COUNT = 20000
+# Matches a single generated move, in its name and in its line's label
+SEARCH_TERM = '0012345'
+
+
+@tagged('post_install', '-at_install', '-standard', 'partner_ledger_plans')
+class TestLedgerPlans(AccountTestInvoicingCommon, TransactionCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        invoice = cls.init_invoice('out_invoice', partner=cls.partner_a, amounts=[100.0], post=True)
+        template_line = invoice.line_ids.filtered(lambda line: line.account_id.account_type == 'asset_receivable')
+        cls.partner = cls.env['res.partner'].create({'name': 'Plans Partner'})
+        other = cls.env['res.partner'].create({'name': 'Plans Other Partner'})
+        generate_ledger(cls.env, cls.partner, template_line, LINE_COUNT, prefix='PLAN')
+        generate_ledger(cls.env, other, template_line, LINE_COUNT, prefix='PLANO')
+
+    def _plans(self, method, *args, **kwargs):
+        """ EXPLAIN output of the queries on the journal items run by ``method`` """
+        cr = self.env.cr
+        queries = []
+        execute = cr.execute
+
+        def record(query, params=None, *args, **kwargs):
+            queries.append((query, params))
+            return execute(query, params, *args, **kwargs)
+
+        LEDGER_CACHE.clear()
+        with patch.object(cr, 'execute', record):
+            method(*args, **kwargs)
+        plans = []
+        for query, params in queries:
+            if 'account_move_line' in query and query.lstrip().upper().startswith('SELECT'):
+                cr.execute(f"EXPLAIN {query}", params)
+                plans.append('\n'.join(row[0] for row in cr.fetchall()))
+        return plans
+
+    def _ledger_plans(self):
+        Ledger = self.env['tt.partner.ledger']
+        plans = {}
+        for name, filters in {
+            'all': Ledger._normalize_filters(),
+            'last_year': Ledger._normalize_filters(**date_range_filters()),
+        }.items():
+            plans[f'{name}/page'] = self._plans(
+                Ledger._read_rows, self.partner, filters, descending=True, limit=101, boundary=0.0)
+            plans[f'{name}/count'] = self._plans(Ledger._count, self.partner, filters)
+            plans[f'{name}/balance'] = self._plans(Ledger._sum_balance, self.partner, filters)
+        return plans
+
+    def test_ledger_plans(self):
+        cr = self.env.cr
+        cr.execute('SAVEPOINT ledger_plans')
+        cr.execute(f'DROP INDEX "{LEDGER_INDEX}"')
+        before = self._ledger_plans()
+        cr.execute('ROLLBACK TO SAVEPOINT ledger_plans')
+        after = self._ledger_plans()
+
+        for case, plans in after.items():
+            _logger.info("Ledger plans of %s without %s:\n%s", case, LEDGER_INDEX, '\n\n'.join(before[case]))
+            _logger.info("Ledger plans of %s with %s:\n%s", case, LEDGER_INDEX, '\n\n'.join(plans))
+            self.assertTrue(plans, f"{case} ran no query on the journal items")
+            for plan in plans:
+                self.assertIn(LEDGER_INDEX, plan, f"{case} does not use the ledger index:\n{plan}")
+
+    def test_search_plans(self):
+        Ledger = self.env['tt.partner.ledger']
+        filters = Ledger._normalize_filters(search_term=SEARCH_TERM)
+        start = time.perf_counter()
+        LEDGER_CACHE.clear()
+        rows = Ledger._read_rows(self.partner, filters, descending=True, limit=101, boundary=0.0)
+        _logger.info("Ledger search of %r among %s lines: %s rows in %.1f ms",
+                     SEARCH_TERM, LINE_COUNT, len(rows), (time.perf_counter() - start) * 1000)
+        self.assertEqual(len(rows), 1)
+
+        plans = {
+            'page': self._plans(Ledger._read_rows, self.partner, filters, descending=True, limit=101, boundary=0.0),
+            'count': self._plans(Ledger._count, self.partner, filters),
+        }
+        for case, case_plans in plans.items():
+            plan = '\n\n'.join(case_plans)
+            _logger.info("Ledger search plans of %s:\n%s", case, plan)
+            for index in TRIGRAM_INDEXES:
+                self.assertIn(index, plan, f"The {case} search does not use {index}:\n{plan}")
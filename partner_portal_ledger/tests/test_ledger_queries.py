@@ -0,0 +1,148 @@
+""" Behaviour of the ledger queries: keyset pages, running balances and group totals """
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.partner_portal_ledger.ledger_cache import LEDGER_CACHE
+from odoo.addons.partner_portal_ledger.models.partner_ledger import LEDGER_ACCOUNT_TYPES
+
+# (move type, date, amount) of the partner's entries; some share a date,
+# so their lines are only ordered by id
+ENTRIES = [
+    ('out_invoice', '2019-11-15', 100.0),
+    ('out_invoice', '2019-12-01', 250.0),
+    ('out_invoice', '2019-12-01', 40.0),
+    ('out_refund', '2019-12-20', 30.0),
+    ('out_invoice', '2020-01-10', 75.0),
+    ('out_invoice', '2020-01-31', 310.0),
+    ('out_refund', '2020-02-01', 60.0),
+    ('out_invoice', '2020-02-01', 90.0),
+    ('out_invoice', '2020-03-15', 120.0),
+    ('out_invoice', '2021-01-05', 500.0),
+]
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerQueries(AccountTestInvoicingCommon, TransactionCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.partner = cls.env['res.partner'].create({'name': 'Ledger Queries Partner'})
+        for move_type, date, amount in ENTRIES:
+            cls.init_invoice(move_type, partner=cls.partner, invoice_date=fields.Date.to_date(date),
+                             amounts=[amount], post=True)
+        cls.Ledger = cls.env['tt.partner.ledger']
+
+    def setUp(self):
+        super().setUp()
+        LEDGER_CACHE.clear()
+
+    def _expected_rows(self, filters):
+        """ ``(id, running balance)`` of the matching lines newest first, and the
+        opening balance, computed from the records
+        """
+        lines = self.env['account.move.line'].search([
+            ('partner_id', '=', self.partner.id),
+            ('account_id.account_type', 'in', LEDGER_ACCOUNT_TYPES),
+        ]).sorted(lambda line: (line.date, line.id))
+        opening_balance = 0.0
+        rows = []
+        for line in lines:
+            date = line.date.isoformat()
+            if filters.date_from and date < filters.date_from:
+                opening_balance += line.balance
+            elif not filters.date_to or date <= filters.date_to:
+                rows.append(line)
+        running_balance = opening_balance
+        expected = []
+        for line in rows:
+            running_balance += line.balance
+            expected.append((line.id, running_balance))
+        return expected[::-1], opening_balance
+
+    def _filter_sets(self):
+        return {
+            'all': self.Ledger._normalize_filters(),
+            'dates': self.Ledger._normalize_filters('2019-12-01', '2020-12-31'),
+            'month': self.Ledger._normalize_filters('2019-12-01', '2020-12-31', group_by='month'),
+        }
+
+    def _assertRows(self, rows, expected, msg=None):
+        self.assertEqual([row.id for row in rows], [line_id for line_id, _balance in expected], msg)
+        for row, (_line_id, running_balance) in zip(rows, expected):
+            self.assertAlmostEqual(row.running_balance, running_balance, 2, msg)
+
+    def test_keyset_pages(self):
+        for name, filters in self._filter_sets().items():
+            expected, _opening_balance = self._expected_rows(filters)
+            self.assertEqual(len(expected), self.Ledger._count(self.partner, filters), name)
+
+            pages = [self.Ledger._get_page(self.partner, filters, limit=3)]
+            self.assertIsNone(pages[0]['prev_cursor'], name)
+            while pages[-1]['next_cursor']:
+                pages.append(self.Ledger._get_page(self.partner, filters, after=pages[-1]['next_cursor'], limit=3))
+            self.assertGreater(len(pages), 2, name)
+            self.assertIsNone(pages[-1]['next_cursor'], name)
+            self._assertRows([row for page in pages for row in page['rows']], expected, name)
+
+            # back from the last page, towards the newest lines
+            back = [pages[-1]]
+            while back[-1]['prev_cursor']:
+                back.append(self.Ledger._get_page(self.partner, filters, before=back[-1]['prev_cursor'], limit=3))
+            self.assertIsNone(back[-1]['prev_cursor'], name)
+            self._assertRows([row for page in reversed(back) for row in page['rows']], expected, name)
+
+    def test_running_balance(self):
+        for name, filters in self._filter_sets().items():
+            expected, opening_balance = self._expected_rows(filters)
+            self.assertAlmostEqual(self.Ledger._opening_balance(self.partner, filters), opening_balance, 2, name)
+            self._assertRows(self.Ledger._read_rows(self.partner, filters, descending=True), expected, name)
+
+            # a deep page is seeded with everything below it
+            first = self.Ledger._get_page(self.partner, filters, limit=2)
+            second = self.Ledger._get_page(self.partner, filters, after=first['next_cursor'], limit=2)
+            deep = self.Ledger._get_page(self.partner, filters, after=second['next_cursor'], limit=2)
+            self._assertRows(deep['rows'], expected[4:6], name)
+
+            for descending in (True, False):
+                single = self.Ledger._read_rows(self.partner, filters, descending=descending)
+                batched = list(self.Ledger._iter_rows(self.partner, filters, descending=descending, batch_size=2))
+                self._assertRows(batched, [(row.id, row.running_balance) for row in single],
+                                 f"{name}, descending={descending}")
+            ascending = self.Ledger._read_rows(self.partner, filters, descending=False)
+            self._assertRows(ascending, expected[::-1], name)
+
+    def test_carried_balance_and_groups(self):
+        filters = self._filter_sets()['month']
+        expected, opening_balance = self._expected_rows(filters)
+        pages = [self.Ledger._get_page(self.partner, filters, limit=3)]
+        while pages[-1]['next_cursor']:
+            pages.append(self.Ledger._get_page(self.partner, filters, after=pages[-1]['next_cursor'], limit=3))
+        for page, next_page in zip(pages, pages[1:]):
+            # the balance carried below a page is the one its next page starts from
+            first = next_page['rows'][0]
+            self.assertAlmostEqual(page['carried_balance'], first.running_balance, 2)
+        self.assertAlmostEqual(pages[-1]['carried_balance'], opening_balance, 2)
+
+        summary = self.Ledger._get_summary(self.partner, filters)
+        count = self.Ledger._count(self.partner, filters)
+        self.assertEqual(summary['count'], count)
+        self.assertEqual(pages[0]['count'], count)
+        self.assertAlmostEqual(summary['opening_balance'], opening_balance, 2)
+        self.assertAlmostEqual(summary['closing_balance'], expected[0][1], 2)
+
+        rows = self.Ledger._read_rows(self.partner, filters, descending=True)
+        groups = {group.group_date: group for group in summary['groups']}
+        self.assertEqual(list(groups), sorted({row.group_date for row in rows}, reverse=True))
+        for group_date, group in groups.items():
+            group_rows = [row for row in rows if row.group_date == group_date]
+            self.assertEqual(group.count, len(group_rows))
+            self.assertAlmostEqual(group.debit, sum(row.debit for row in group_rows), 2)
+            self.assertAlmostEqual(group.credit, sum(row.credit for row in group_rows), 2)
+            self.assertAlmostEqual(group.net, sum(row.balance for row in group_rows), 2)
+        for page in pages:
+            # a page carries the totals of every group it shows, whole
+            self.assertEqual({group.group_date for group in page['groups']},
+                             {row.group_date for row in page['rows']})
+            for group in page['groups']:
+                self.assertEqual(group, groups[group.group_date])
@@ -0,0 +1,107 @@
+""" Smoke tests of the portal ledger routes, as a portal user with a few lines """
+import io
+
+from odoo.tests import HttpCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.partner_portal_ledger import exporters
+from odoo.addons.partner_portal_ledger.ledger_cache import LEDGER_CACHE
+from odoo.addons.partner_portal_ledger.models.partner_ledger import LEDGER_ACCOUNT_TYPES
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerRoutes(AccountTestInvoicingCommon, HttpCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.invoice = cls.init_invoice('out_invoice', partner=cls.partner_a, amounts=[100.0], post=True)
+        cls.portal_user = cls.env['res.users'].create({
+            'name': cls.partner_a.name,
+            'login': 'ledger_portal',
+            'password': 'ledger_portal',
+            'partner_id': cls.partner_a.id,
+            'groups_id': [(6, 0, [cls.env.ref('base.group_portal').id])],
+        })
+
+    def setUp(self):
+        super().setUp()
+        LEDGER_CACHE.clear()
+        self.authenticate('ledger_portal', 'ledger_portal')
+
+    def test_ledger_page(self):
+        response = self.url_open('/my/ledger')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.invoice.name, response.text)
+
+    def test_ledger_page_not_modified(self):
+        response = self.url_open('/my/ledger')
+        self.assertEqual(response.status_code, 200)
+        response = self.url_open('/my/ledger', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_export_csv(self):
+        response = self.url_open('/my/ledger/export/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/csv'))
+        self.assertIn(self.invoice.name, response.text)
+
+    def _export_columnar(self, fmt):
+        if not exporters.is_available(fmt):
+            self.skipTest(f"the {fmt} exporter is not available")
+        response = self.url_open(f'/my/ledger/export/{fmt}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], exporters.get_exporter(fmt).content_type)
+        return io.BytesIO(response.content)
+
+    def _assertColumnarLedger(self, table):
+        line = self.invoice.line_ids.filtered(lambda line: line.account_id.account_type in LEDGER_ACCOUNT_TYPES)
+        [row] = table.to_pylist()
+        self.assertEqual((row['id'], row['date'], row['move']), (line.id, line.date, self.invoice.name))
+        self.assertAlmostEqual(float(row['debit']), line.debit)
+        self.assertAlmostEqual(float(row['credit']), line.credit)
+        self.assertAlmostEqual(float(row['balance']), line.balance)
+        self.assertAlmostEqual(float(row['running_balance']), line.balance)
+        self.assertEqual(table.schema.metadata[b'opening_balance'], b'0.00')
+
+    def test_export_parquet(self):
+        output = self._export_columnar('parquet')
+        import pyarrow.parquet as pq
+        self._assertColumnarLedger(pq.read_table(output))
+
+    def test_export_arrow(self):
+        output = self._export_columnar('arrow')
+        import pyarrow as pa
+        self._assertColumnarLedger(pa.ipc.open_stream(output).read_all())
+
+    def test_export_job_needs_post(self):
+        jobs = self.env['tt.partner.ledger.export.job'].sudo()
+        job_count = jobs.search_count([])
+        response = self.url_open('/my/ledger/export/csv?mode=job')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/csv'))
+        self.assertEqual(jobs.search_count([]), job_count)
+
+    def test_ledger_page_modified_by_partner(self):
+        response = self.url_open('/my/ledger')
+        self.partner_a.write({'name': 'Renamed Partner'})
+        # every write of the test transaction is stamped with its start
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE res_partner SET write_date = write_date + interval '1 second' WHERE id = %s",
+                            [self.partner_a.id])
+        self.env.invalidate_all()
+        response = self.url_open('/my/ledger', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed Partner', response.text)
+
+    def test_ledger_detail(self):
+        line = self.invoice.line_ids.filtered(lambda line: line.account_id.account_type == 'asset_receivable')
+        response = self.url_open(f'/my/ledger/detail/{line.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.invoice.name, response.text)
+
+    def test_ledger_detail_other_partner(self):
+        invoice = self.init_invoice('out_invoice', partner=self.partner_b, amounts=[50.0], post=True)
+        line = invoice.line_ids.filtered(lambda line: line.account_id.account_type == 'asset_receivable')
+        response = self.url_open(f'/my/ledger/detail/{line.id}')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(invoice.name, response.text)
@@ -0,0 +1,97 @@
+""" Opening balances read from the monthly snapshots, against the lines.
+
+As in ``test_ledger_cache``, the registry is put in test mode and commits
+are emulated, so the change markers are applied as they would be.
+"""
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.partner_portal_ledger.models.partner_ledger import LEDGER_ACCOUNT_TYPES
+
+# (move type, date, amount) of the partners' entries, around a mid-month DATE_FROM
+ENTRIES = [
+    ('out_invoice', '2019-11-15', 100.0),
+    ('out_invoice', '2019-12-01', 250.0),
+    ('out_refund', '2019-12-20', 30.0),
+    ('out_invoice', '2020-01-31', 310.0),
+    ('out_invoice', '2020-02-01', 90.0),
+    ('out_refund', '2020-02-09', 60.0),
+    ('out_invoice', '2020-02-10', 75.0),
+    ('out_invoice', '2020-03-15', 500.0),
+]
+DATE_FROM = '2020-02-10'
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerSnapshots(AccountTestInvoicingCommon, TransactionCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.partners = cls.env['res.partner'].create([
+            {'name': 'Snapshot Partner A'},
+            {'name': 'Snapshot Partner B'},
+        ])
+        for factor, partner in enumerate(cls.partners, start=1):
+            for move_type, date, amount in ENTRIES:
+                cls.init_invoice(move_type, partner=partner, invoice_date=fields.Date.to_date(date),
+                                 amounts=[amount * factor], post=True)
+        cls.Ledger = cls.env['tt.partner.ledger']
+        cls.Snapshot = cls.env['tt.partner.ledger.snapshot']
+        cls.Snapshot._cron_verify_snapshots()
+
+    def setUp(self):
+        super().setUp()
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        self._commit()
+        self.filters = self.Ledger._normalize_filters(DATE_FROM)
+        self.assertTrue(self.Snapshot._is_ready())
+
+    def _commit(self):
+        """ Run what a commit runs; what follows acts as a new transaction """
+        self.env.flush_all()
+        self.cr.precommit.run()
+        self.cr.postcommit.run()
+        self.env.invalidate_all()
+
+    def _expected(self, partner):
+        lines = self.env['account.move.line'].search([
+            ('partner_id', '=', partner.id),
+            ('partner_ledger_account_type', 'in', LEDGER_ACCOUNT_TYPES),
+            ('date', '<', DATE_FROM),
+        ])
+        return sum(lines.mapped('balance'))
+
+    def _assertOpeningBalances(self, dirty):
+        """ Check the opening balances of both partners, ``dirty`` ones being read from the lines only """
+        self.assertEqual(self.Snapshot._dirty_partner_ids(self.partners), set(dirty.ids))
+        balances = self.Ledger._opening_balances(self.partners, self.filters)
+        for partner in self.partners:
+            self.assertAlmostEqual(balances[partner.id], self._expected(partner))
+            self.assertAlmostEqual(self.Ledger._opening_balance(partner, self.filters), balances[partner.id])
+
+    def test_clean_partners(self):
+        self._assertOpeningBalances(dirty=self.partners.browse())
+        self.assertTrue(self.Snapshot.search([('partner_id', 'in', self.partners.ids)]))
+
+    def test_dirty_partner(self):
+        partner_a, partner_b = self.partners
+        self.init_invoice('out_invoice', partner=partner_a, invoice_date=fields.Date.to_date('2019-12-05'),
+                          amounts=[42.0], post=True)
+        # partner A's cells are stale until applied, partner B's are still used
+        self._assertOpeningBalances(dirty=partner_a)
+        self._commit()
+        self._assertOpeningBalances(dirty=self.partners.browse())
+
+    def test_edited_line(self):
+        partner_b = self.partners[1]
+        invoice = self.init_invoice('out_invoice', partner=partner_b, invoice_date=fields.Date.to_date('2020-02-20'),
+                                    amounts=[64.0])
+        self._commit()
+        self._assertOpeningBalances(dirty=self.partners.browse())
+        # moving the entry before DATE_FROM moves its lines out of February's cell
+        invoice.date = fields.Date.to_date('2019-12-10')
+        self._assertOpeningBalances(dirty=partner_b)
+        self._commit()
+        self._assertOpeningBalances(dirty=self.partners.browse())
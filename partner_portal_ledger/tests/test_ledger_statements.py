@@ -0,0 +1,110 @@
+""" Month-end statements: which export requests they serve, and when they are dropped.
+
+As in ``test_ledger_cache``, the registry is put in test mode and commits
+are emulated, so the change markers are applied as they would be.
+"""
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+DATE_FORMAT = '%Y-%m-%d'
+MONTHS = ['2020-01-01', '2020-02-01', '2020-03-01']
+FEBRUARY = ('2020-02-01', '2020-02-29')
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerStatements(AccountTestInvoicingCommon, TransactionCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.partner = cls.env['res.partner'].create({'name': 'Statement Partner'})
+        for month in MONTHS:
+            cls.init_invoice('out_invoice', partner=cls.partner, invoice_date=fields.Date.to_date(month),
+                             amounts=[100.0], post=True)
+        cls.Ledger = cls.env['tt.partner.ledger']
+        cls.Statement = cls.env['tt.partner.ledger.statement']
+        cls.statements = cls.Statement.create([{
+            'partner_id': cls.partner.id,
+            'month': month,
+            'fmt': 'xlsx',
+            'date_format': DATE_FORMAT,
+            'attachment_id': cls.env['ir.attachment'].create({'name': f'{month}.xlsx', 'raw': b'statement'}).id,
+        } for month in MONTHS])
+
+    def setUp(self):
+        super().setUp()
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        self._commit()
+
+    def _commit(self):
+        """ Run what a commit runs; what follows acts as a new transaction """
+        self.env.flush_all()
+        self.cr.precommit.run()
+        self.cr.postcommit.run()
+        self.env.invalidate_all()
+
+    def _find(self, date_from, date_to, search_term='', group_by='none', fmt='xlsx', date_format=DATE_FORMAT):
+        filters = self.Ledger._normalize_filters(date_from, date_to, search_term, group_by)
+        return self.Statement._find(self.partner, fmt, filters, date_format)
+
+    def test_find_exact_month(self):
+        january, february, march = self.statements
+        self.assertEqual(self._find(*FEBRUARY), february)
+        self.assertEqual(self._find('2020-01-01', '2020-01-31'), january)
+        self.assertEqual(self._find('2020-03-01', '2020-03-31'), march)
+
+    def test_find_other_filters(self):
+        for args, kwargs in [
+            (('2020-02-01', '2020-02-28'), {}),
+            (('2020-02-02', '2020-02-29'), {}),
+            (('2020-01-01', '2020-02-29'), {}),
+            (('2020-02-01', None), {}),
+            (FEBRUARY, {'search_term': 'INV'}),
+            (FEBRUARY, {'group_by': 'month'}),
+            (FEBRUARY, {'fmt': 'csv'}),
+            (FEBRUARY, {'fmt': 'pdf'}),
+            (FEBRUARY, {'date_format': '%d/%m/%Y'}),
+        ]:
+            with self.subTest(args=args, **kwargs):
+                self.assertFalse(self._find(*args, **kwargs))
+
+    def test_find_current_month(self):
+        today = fields.Date.context_today(self.Statement)
+        month = today.replace(day=1)
+        self.Statement.create({
+            'partner_id': self.partner.id,
+            'month': month,
+            'fmt': 'xlsx',
+            'date_format': DATE_FORMAT,
+            'attachment_id': self.env['ir.attachment'].create({'name': 'current.xlsx', 'raw': b'statement'}).id,
+        })
+        month_end = fields.Date.end_of(month, 'month')
+        self.assertFalse(self._find(month.isoformat(), month_end.isoformat()))
+
+    def test_stale_from_changed_month(self):
+        january, february, march = self.statements
+        self.init_invoice('out_invoice', partner=self.partner, invoice_date=fields.Date.to_date('2020-02-15'),
+                          amounts=[40.0], post=True)
+        self.env.flush_all()
+        self.cr.precommit.run()
+        # logged, not applied yet: February's and later statements are not served
+        self.assertEqual(self._find('2020-01-01', '2020-01-31'), january)
+        self.assertFalse(self._find(*FEBRUARY))
+        self.assertFalse(self._find('2020-03-01', '2020-03-31'))
+        self.cr.postcommit.run()
+        self.env.invalidate_all()
+        self.assertEqual(self.statements.exists(), january)
+        self.assertFalse((february | march).attachment_id.exists())
+
+    def test_stale_from_earlier_month(self):
+        line = self.env['account.move.line'].search([
+            ('partner_id', '=', self.partner.id),
+            ('account_id.account_type', '=', 'asset_receivable'),
+            ('date', '<', '2020-02-01'),
+        ])
+        line.name = 'Renamed line'
+        self._commit()
+        self.assertFalse(self.statements.exists())
+        self.assertFalse(self._find(*FEBRUARY))
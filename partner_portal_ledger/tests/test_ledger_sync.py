@@ -0,0 +1,135 @@
+""" Tests of the ``/ledger/sync`` delta API.
+
+Requests run in the test transaction, whose start stamps every write, so
+the lines and tombstones are stamped explicitly and the sync horizon is
+patched to a time of the test's choosing.
+"""
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from odoo.tests import HttpCase, tagged
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.partner_portal_ledger.models.partner_ledger import LEDGER_ACCOUNT_TYPES
+
+
+@tagged('post_install', '-at_install')
+class TestLedgerSync(AccountTestInvoicingCommon, HttpCase):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        for amount in (100.0, 200.0, 300.0):
+            cls.init_invoice('out_invoice', partner=cls.partner_a, amounts=[amount], post=True)
+        cls.sync_token = cls.env['tt.partner.ledger.sync.token'].create({
+            'name': 'ERP',
+            'partner_id': cls.partner_a.id,
+        })
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate(None, None)
+        self.now = datetime.utcnow().replace(microsecond=0)
+        self.lines = self.env['account.move.line'].search([
+            ('partner_id', '=', self.partner_a.id),
+            ('partner_ledger_account_type', 'in', LEDGER_ACCOUNT_TYPES),
+        ])
+        self._stamp(self.lines, self.now - timedelta(hours=1))
+        self.horizon = self.now
+        patcher = patch.object(type(self.env['tt.partner.ledger']), '_sync_horizon', lambda _self: self.horizon)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _stamp(self, lines, when):
+        """ Set the write date of ``lines`` and of their tombstones to ``when`` """
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE account_move_line SET write_date = %s WHERE id IN %s", [when, tuple(lines.ids)])
+        self.env.cr.execute("UPDATE partner_ledger_tombstone SET deleted_at = %s WHERE line_id IN %s",
+                            [when, tuple(lines.ids)])
+        self.env.invalidate_all()
+
+    def _request(self, cursor=None, limit=None, token=None):
+        params = {key: value for key, value in (('cursor', cursor), ('limit', limit)) if value is not None}
+        token = self.sync_token.access_token if token is None else token
+        return self.url_open(f'/ledger/sync?{urlencode(params)}', headers={'Authorization': f'Bearer {token}'})
+
+    def _sync(self, cursor=None, limit=None):
+        """ Return the ``(changes, cursor, has_more)`` of one sync request """
+        response = self._request(cursor, limit)
+        self.assertEqual(response.status_code, 200)
+        changes = [json.loads(line) for line in response.text.splitlines()]
+        return changes, response.headers['X-Ledger-Cursor'], response.headers['X-Ledger-Has-More'] == '1'
+
+    def test_invalid_token(self):
+        self.assertEqual(self._request(token='not-a-token').status_code, 401)
+        self.assertEqual(self.url_open('/ledger/sync').status_code, 401)
+        self.sync_token.active = False
+        self.assertEqual(self._request().status_code, 401)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self._request(cursor='yesterday').status_code, 400)
+        expired = (self.now - timedelta(days=365)).isoformat()
+        self.assertEqual(self._request(cursor=f'{expired}_0').status_code, 410)
+
+    def test_full_sync(self):
+        changes, cursor, has_more = self._sync()
+        self.assertFalse(has_more)
+        self.assertEqual([change['op'] for change in changes], ['upsert'] * len(self.lines))
+        self.assertEqual(sorted(change['id'] for change in changes), sorted(self.lines.ids))
+        for change in changes:
+            line = self.lines.browse(change['id'])
+            self.assertAlmostEqual(change['balance'], line.balance)
+        # the same cursor again gives nothing new
+        self.assertEqual(self._sync(cursor)[0], [])
+        self.assertEqual(self._sync(cursor)[0], [])
+
+    def test_paging(self):
+        changes, cursor, has_more = self._sync(limit=2)
+        self.assertEqual(len(changes), 2)
+        self.assertTrue(has_more)
+        more, cursor, has_more = self._sync(cursor, limit=2)
+        self.assertEqual(len(more), len(self.lines) - 2)
+        self.assertFalse(has_more)
+        self.assertEqual(sorted(change['id'] for change in changes + more), sorted(self.lines.ids))
+
+    def test_cursor_advances_without_changes(self):
+        Ledger = self.env['tt.partner.ledger']
+        _changes, cursor, _has_more = self._sync()
+        changes, cursor, _has_more = self._sync(cursor)
+        self.assertEqual(changes, [])
+        self.assertEqual(Ledger._parse_sync_cursor(cursor), (self.horizon, 0))
+        self.horizon += timedelta(minutes=5)
+        changes, cursor, _has_more = self._sync(cursor)
+        self.assertEqual(changes, [])
+        self.assertEqual(Ledger._parse_sync_cursor(cursor), (self.horizon, 0))
+
+    def test_edited_line_sent_once(self):
+        _changes, cursor, _has_more = self._sync()
+        line = self.lines[0]
+        line.name = 'Edited line'
+        self._stamp(line, self.now - timedelta(minutes=30))
+        changes, cursor, _has_more = self._sync(cursor)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual((changes[0]['op'], changes[0]['id'], changes[0]['name']), ('upsert', line.id, 'Edited line'))
+        self.assertEqual(self._sync(cursor)[0], [])
+
+    def test_edit_after_horizon_held_back(self):
+        _changes, cursor, _has_more = self._sync()
+        line = self.lines[0]
+        line.name = 'Edited line'
+        self._stamp(line, self.now + timedelta(minutes=1))
+        changes, cursor, _has_more = self._sync(cursor)
+        self.assertEqual(changes, [])
+        self.horizon += timedelta(minutes=5)
+        changes, cursor, _has_more = self._sync(cursor)
+        self.assertEqual([change['id'] for change in changes], [line.id])
+
+    def test_moved_line_tombstone(self):
+        _changes, cursor, _has_more = self._sync()
+        line = self.lines[0]
+        line.partner_id = self.partner_b
+        self._stamp(line, self.now - timedelta(minutes=30))
+        changes, cursor, _has_more = self._sync(cursor)
+        self.assertEqual(changes, [{'op': 'delete', 'id': line.id, 'changed_at': changes[0]['changed_at']}])
+        self.assertEqual(self._sync(cursor)[0], [])